@@ -1,24 +1,94 @@
 import time
+_STARTUP_T0 = time.perf_counter()
 import threading
 import ctypes
 from ctypes import POINTER, cast
-import comtypes
-from comtypes import CLSCTX_ALL
-from pycaw.pycaw import AudioUtilities, IMMDeviceEnumerator
-from pycaw.constants import CLSID_MMDeviceEnumerator
-from pycaw.pycaw import IAudioMeterInformation as PycawIAudioMeterInformation
-import pystray
-from PIL import Image, ImageDraw
+try:
+    import comtypes
+    from comtypes import CLSCTX_ALL
+    from pycaw.pycaw import AudioUtilities, IMMDeviceEnumerator
+    from pycaw.constants import CLSID_MMDeviceEnumerator
+    from pycaw.pycaw import IAudioMeterInformation as PycawIAudioMeterInformation
+except ImportError:
+    # pycaw/comtypes are Windows-only; the synthetic, WAV and FIFO meter sources work without them
+    comtypes = None
+    PycawIAudioMeterInformation = None
 import argparse
 import sys
 import json
 import os
-import tkinter as tk
-from tkinter import ttk, messagebox, colorchooser
+import math
+import random
+import itertools
+import bisect
+import queue
+import select
+import wave
+import struct
+from array import array
+from collections import deque, namedtuple
+from functools import lru_cache
 
 # Use IAudioMeterInformation from pycaw
 IAudioMeterInformation = PycawIAudioMeterInformation
 
+
+class StartupProfile:
+    """Wall-clock time from process start to each startup phase, reported by --profile-startup."""
+
+    PHASES = ('imports', 'config load', 'device resolution', 'meter activation', 'first frame', 'first icon shown')
+
+    def __init__(self, t0):
+        self.t0 = t0
+        self.enabled = False
+        self.marks = {}
+        # Phases that do not happen in this run (e.g. no tray icon when headless)
+        self.skipped = set()
+        self._lock = threading.Lock()
+        self._reported = False
+
+    def mark(self, phase):
+        with self._lock:
+            if phase in self.marks:
+                return
+            self.marks[phase] = time.perf_counter() - self.t0
+        self._maybe_report()
+
+    def skip(self, phase):
+        """Leave out a phase that does not apply to this run; the report no longer waits for it."""
+        with self._lock:
+            self.skipped.add(phase)
+        self._maybe_report()
+
+    def _maybe_report(self):
+        with self._lock:
+            # Phases finish on different threads; report once the last one that applies is in
+            done = (self.enabled and not self._reported
+                    and all(p in self.marks or p in self.skipped for p in self.PHASES))
+            if done:
+                self._reported = True
+        if done:
+            # stderr: with --headless, stdout carries the level stream
+            print(self.report(), file=sys.stderr, flush=True)
+
+    def report(self):
+        lines = ['Startup profile (ms since process start / since previous phase):']
+        prev = 0.0
+        for phase in self.PHASES:
+            at = self.marks.get(phase)
+            if at is None and phase in self.skipped:
+                continue
+            if at is None:
+                lines.append(f'  {phase:<20} -')
+                continue
+            lines.append(f'  {phase:<20} {at * 1000.0:8.1f} {max(0.0, at - prev) * 1000.0:8.1f}')
+            prev = max(prev, at)
+        return '\n'.join(lines)
+
+
+startup_profile = StartupProfile(_STARTUP_T0)
+startup_profile.mark('imports')
+
 # Config paths
 CONFIG_DIR = os.path.join(os.getenv('APPDATA') or os.path.expanduser('~'), 'VU_Meter')
 CONFIG_PATH = os.path.join(CONFIG_DIR, 'config.json')
@@ -45,7 +115,7 @@ def save_config(devices_ordered):
         return False
 
 
-def list_all_devices():
+def _enumerate_devices():
     # Ensure COM is initialized for the calling thread (safe to call multiple times)
     coinit = False
     try:
@@ -68,380 +138,3325 @@ def list_all_devices():
                 except Exception:
                     did = None
             if did:
-                devices.append({'id': did, 'name': name})
+                try:
+                    state = getattr(d, 'State', None)
+                except Exception:
+                    state = None
+                devices.append({'id': did, 'name': name, 'state': state})
         return devices
     finally:
-        if coinit:
-            try:
-                comtypes.CoUninitialize()
-            except Exception:
-                pass
+        if coinit:
+            try:
+                comtypes.CoUninitialize()
+            except Exception:
+                pass
+
+# --- Get default render device ---
+
+def _query_default_render_device_id():
+    coinit = False
+    try:
+        try:
+            comtypes.CoInitialize()
+            coinit = True
+        except Exception:
+            pass
+        try:
+            enumerator = comtypes.CoCreateInstance(
+                CLSID_MMDeviceEnumerator,
+                IMMDeviceEnumerator,
+                CLSCTX_ALL
+            )
+            dev = enumerator.GetDefaultAudioEndpoint(0, 1)
+            did = dev.GetId()
+            try:
+                enumerator.Release()
+            except Exception:
+                pass
+            return did
+        except Exception:
+            return None
+    finally:
+        if coinit:
+            try:
+                comtypes.CoUninitialize()
+            except Exception:
+                pass
+
+# --- Device registry ---
+
+class DeviceRegistry:
+    """Process-wide cache of audio endpoints, indexed by id and lower-cased name.
+
+    Endpoints are enumerated once, on first use. Endpoint add/remove/state
+    notifications invalidate the cache and default-device changes update it in
+    place, so lookups do not walk every endpoint through COM each time.
+    `enumerate_fn` and `default_fn` are injectable for tests (see FakeDeviceNotifier).
+    """
+
+    def __init__(self, enumerate_fn=_enumerate_devices, default_fn=_query_default_render_device_id):
+        self._enumerate_fn = enumerate_fn
+        self._default_fn = default_fn
+        self._lock = threading.RLock()
+        self._devices = None
+        self._by_id = {}
+        self._by_name = {}
+        self._default_id = None
+        self._default_known = False
+        self._notifier = None
+        # Full enumerations performed; stays flat while the cache is valid
+        self.enumerations = 0
+
+    def _ensure(self):
+        with self._lock:
+            if self._devices is None:
+                devices = self._enumerate_fn()
+                self.enumerations += 1
+                self._devices = devices
+                self._by_id = {d['id']: d for d in devices}
+                self._by_name = {}
+                for d in devices:
+                    self._by_name.setdefault((d.get('name') or '').lower(), d)
+            return self._devices
+
+    def devices(self):
+        """All endpoints as {'id', 'name', 'state'} dicts, in enumeration order."""
+        return [dict(d) for d in self._ensure()]
+
+    def get(self, eid):
+        self._ensure()
+        d = self._by_id.get(eid)
+        return dict(d) if d else None
+
+    def name_of(self, eid, default=None):
+        d = self.get(eid)
+        return d['name'] if d else default
+
+    def find(self, token):
+        """Resolve a CLI/config token (list index, exact name or name substring) to an endpoint id."""
+        devices = self._ensure()
+        token = token.strip()
+        if token in self._by_id:
+            return token
+        if token.isdigit():
+            i = int(token)
+            return devices[i]['id'] if 0 <= i < len(devices) else None
+        token_l = token.lower()
+        d = self._by_name.get(token_l)
+        if d is not None:
+            return d['id']
+        # If multiple devices match the substring, pick the first
+        for d in devices:
+            if token_l in (d.get('name') or '').lower():
+                return d['id']
+        return None
+
+    def default_render_id(self):
+        with self._lock:
+            if not self._default_known:
+                self._default_id = self._default_fn()
+                self._default_known = True
+            return self._default_id
+
+    def invalidate(self, default=False):
+        """Drop the cached endpoints (and with `default`, the default render endpoint)."""
+        with self._lock:
+            self._devices = None
+            self._by_id = {}
+            self._by_name = {}
+            if default:
+                self._default_known = False
+
+    # IMMNotificationClient events (called on COM threads or by FakeDeviceNotifier)
+
+    def on_device_added(self, eid):
+        self.invalidate()
+
+    def on_device_removed(self, eid):
+        self.invalidate()
+
+    def on_device_state_changed(self, eid, state):
+        self.invalidate()
+
+    def on_default_device_changed(self, flow, role, eid):
+        # Only the default console render endpoint (eRender=0, eMultimedia=1) is tracked
+        if flow == 0 and role == 1:
+            with self._lock:
+                self._default_id = eid
+                self._default_known = True
+
+    def watch(self):
+        """Register for endpoint notifications; returns False when unavailable (no pycaw callbacks)."""
+        if self._notifier is not None:
+            return True
+        try:
+            self._notifier = _register_endpoint_notifications(self)
+        except Exception:
+            self._notifier = None
+        return self._notifier is not None
+
+    @property
+    def watching(self):
+        """True while endpoint notifications keep the cache current."""
+        return self._notifier is not None
+
+    def unwatch(self):
+        notifier, self._notifier = self._notifier, None
+        if notifier is not None:
+            try:
+                notifier.close()
+            except Exception:
+                pass
+
+
+class _ComEndpointNotifier:
+    """Keeps an IMMNotificationClient registered with an enumerator until close()."""
+
+    def __init__(self, registry):
+        from pycaw.callbacks import MMNotificationClient
+
+        class _Client(MMNotificationClient):
+            def on_device_added(self, device_id):
+                registry.on_device_added(device_id)
+
+            def on_device_removed(self, device_id):
+                registry.on_device_removed(device_id)
+
+            def on_device_state_changed(self, device_id, new_state, new_state_id):
+                registry.on_device_state_changed(device_id, new_state_id)
+
+            def on_default_device_changed(self, flow, flow_id, role, role_id, default_device_id):
+                registry.on_default_device_changed(flow_id, role_id, default_device_id)
+
+            def on_property_value_changed(self, device_id, key, fmtid, pid):
+                pass
+
+        self._client = _Client()
+        self._enumerator = comtypes.CoCreateInstance(CLSID_MMDeviceEnumerator, IMMDeviceEnumerator, CLSCTX_ALL)
+        self._enumerator.RegisterEndpointNotificationCallback(self._client)
+
+    def close(self):
+        self._enumerator.UnregisterEndpointNotificationCallback(self._client)
+
+
+def _register_endpoint_notifications(registry):
+    return _ComEndpointNotifier(registry)
+
+
+class FakeDeviceNotifier:
+    """Drives a DeviceRegistry the way IMMNotificationClient would, over an in-memory device list."""
+
+    def __init__(self, devices=(), default_id=None):
+        self.devices = [dict(d) for d in devices]
+        self.default_id = default_id
+        self.registry = DeviceRegistry(lambda: [dict(d) for d in self.devices], lambda: self.default_id)
+
+    def add(self, eid, name, state=1):
+        self.devices.append({'id': eid, 'name': name, 'state': state})
+        self.registry.on_device_added(eid)
+
+    def remove(self, eid):
+        self.devices = [d for d in self.devices if d['id'] != eid]
+        self.registry.on_device_removed(eid)
+
+    def set_default(self, eid):
+        self.default_id = eid
+        self.registry.on_default_device_changed(0, 1, eid)
+
+
+device_registry = DeviceRegistry()
+
+
+def list_all_devices():
+    return device_registry.devices()
+
+
+def get_default_render_device_id():
+    return device_registry.default_render_id()
+
+
+# --- Tray Icon handling ---
+
+def _parse_color(c, default):
+    try:
+        if isinstance(c, (tuple, list)) and len(c) >= 3:
+            return (int(c[0]) & 255, int(c[1]) & 255, int(c[2]) & 255)
+        if isinstance(c, str):
+            s = c.strip()
+            if s.startswith('#'):
+                s = s[1:]
+            if len(s) == 6:
+                return (int(s[0:2], 16), int(s[2:4], 16), int(s[4:6], 16))
+    except Exception:
+        pass
+    return default
+
+
+# Compiled render plan: everything create_multi_icon() and the worker need per frame,
+# parsed once from the device settings instead of on every tick.
+ICON_SIZE = 32
+# Tray icon sizes the shell uses at 100-400% scaling; per-device widths in settings are in 32-px units
+ICON_SIZES = (16, 20, 24, 32, 40, 48, 64)
+LAYOUT_UNITS = 32
+DEFAULT_COLORS = ((0, 255, 0), (255, 255, 0), (255, 0, 0))
+
+# Display levels are quantized to this many steps before the curve lookup
+CURVE_LUT_SIZE = 4096
+
+# Bar styles: 'flat' colors the whole bar by its level (low/mid/high); 'gradient' and
+# 'segments' color each row by its position, from a cached full-height sprite.
+BAR_STYLES = ('flat', 'gradient', 'segments')
+# Most distinct rows of a gradient, before the palette budget lowers it for many gradient bars
+GRADIENT_STEPS = 16
+PALETTE_SIZE = 256
+# Bar sprites kept across settings changes; least recently used ones are evicted
+SPRITE_CACHE_SIZE = 64
+
+# gain: clamped >= 0; exponent: 1/f of the display curve; colors: parsed (low, mid, high)
+# RGB tuples; x0/x1: resolved pixel column range [x0, x1) of the bar in the icon;
+# lut: CurveLUT for (exponent, size); sprite: None for flat bars, else bar_sprite() rows.
+DeviceSpec = namedtuple('DeviceSpec', ('gain', 'exponent', 'colors', 'x0', 'x1', 'lut', 'sprite'))
+# devices: one DeviceSpec per bar, i.e. per channel when a device is split into channels
+RenderPlan = namedtuple('RenderPlan', ('size', 'devices'))
+# heights[q] / colors[q]: bar height in px and color index (0=low, 1=mid, 2=high) for quantized level q
+CurveLUT = namedtuple('CurveLUT', ('heights', 'colors'))
+
+
+def quantize_level(lvl):
+    """Map a level in [0..1] to its CurveLUT index (out-of-range values are clamped)."""
+    if not lvl > 0.0:
+        return 0
+    if lvl >= 1.0:
+        return CURVE_LUT_SIZE - 1
+    return int(lvl * (CURVE_LUT_SIZE - 1) + 0.5)
+
+
+@lru_cache(maxsize=64)
+def curve_lut(exponent, size, step=1, flat=True):
+    # Nonlinear display curve x^(1/f), evaluated once per quantized level instead of per bar per frame.
+    # step: heights snap down to whole segments; flat=False: styled bars take colors from their sprite.
+    heights = bytearray(CURVE_LUT_SIZE)
+    colors = bytearray(CURVE_LUT_SIZE)
+    top = CURVE_LUT_SIZE - 1
+    for q in range(CURVE_LUT_SIZE):
+        disp = pow(q / top, exponent)
+        h = min(size, int(round(disp * size)))
+        heights[q] = h - h % step
+        if flat:
+            colors[q] = 0 if disp < 0.8 else (1 if disp < 0.9 else 2)
+    return CurveLUT(bytes(heights), bytes(colors))
+
+
+def _segment_rows(size):
+    # LED segment pitch: lit rows plus one dark gap row
+    return max(2, size // 8)
+
+
+def _mix(a, b, t):
+    return tuple(int(round(x + (y - x) * t)) for x, y in zip(a, b))
+
+
+@lru_cache(maxsize=SPRITE_CACHE_SIZE)
+def bar_sprite(style, size, colors, steps=GRADIENT_STEPS):
+    """Full-height column of a styled bar: one RGB color per row from the bottom (None = dark gap).
+
+    A frame shows the bottom h rows of it; the colors follow the flat style's thresholds
+    (low below 80% of the height, mid below 90%, high above).
+    """
+    low, mid, high = colors
+    rows = []
+    if style == 'segments':
+        pitch = _segment_rows(size)
+        for y in range(size):
+            if y % pitch == pitch - 1:
+                rows.append(None)
+                continue
+            top = (y - y % pitch + pitch) / size
+            rows.append(low if top <= 0.8 else (mid if top <= 0.9 else high))
+    else:
+        steps = max(2, steps)
+        for y in range(size):
+            # Quantized position keeps a bar to `steps` palette entries
+            t = (min(steps - 1, int((y + 0.5) / size * steps)) + 0.5) / steps
+            rows.append(_mix(low, mid, t / 0.8) if t < 0.8 else _mix(mid, high, (t - 0.8) / 0.2))
+    return tuple(rows)
+
+
+def _bar_widths(settings, n, width):
+    # Widths from settings are laid out on the 32-px grid, then the column boundaries are scaled to `width`
+    units = _bar_units(settings, n, LAYOUT_UNITS)
+    if units is None:
+        return _equal_split(n, width)
+    if width == LAYOUT_UNITS:
+        return units
+    widths = []
+    edge = 0
+    acc = 0
+    for u in units:
+        acc += u
+        nxt = (acc * width + LAYOUT_UNITS // 2) // LAYOUT_UNITS
+        widths.append(nxt - edge)
+        edge = nxt
+    return widths
+
+
+def _equal_split(n, width):
+    base = width // n
+    rem = width - base * n
+    first = base + rem
+    return [first] + [base] * (n - 1)
+
+
+def _bar_units(settings, n, width):
+    # Determine per-bar widths. If settings specify positive widths, use them; else None (equal split with remainder to first).
+    specified = []
+    remaining = width
+    if settings and len(settings) >= n:
+        for i in range(n):
+            w = max(0, int(settings[i].get('width', 0) or 0))
+            specified.append(w)
+            remaining -= w
+    if not settings or len(settings) < n or remaining < 0 or all(w <= 0 for w in specified):
+        return None
+    # distribute remaining equally among bars with zero/unspecified width; first gets remainder
+    zeros = [i for i, w in enumerate(specified) if w == 0]
+    if zeros:
+        base = remaining // len(zeros)
+        rem = remaining - base * len(zeros)
+        for k, i in enumerate(zeros):
+            add = base + (rem if k == 0 else 0)
+            specified[i] = add
+    return specified[:n]
+
+
+def _compile_device(s, x0, x1, size, steps=GRADIENT_STEPS):
+    gain = 1.0
+    f = 1.0
+    colors = DEFAULT_COLORS
+    style = 'flat'
+    if s:
+        style = s.get('style') if s.get('style') in BAR_STYLES else 'flat'
+        try:
+            gain = float(s.get('gain', 1.0))
+        except Exception:
+            gain = 1.0
+        try:
+            f = float(s.get('curve', 1.0))
+        except Exception:
+            f = 1.0
+        if f <= 0:
+            f = 1.0
+        cols = s.get('colors') or {}
+        colors = (
+            _parse_color(cols.get('low'), DEFAULT_COLORS[0]),
+            _parse_color(cols.get('mid'), DEFAULT_COLORS[1]),
+            _parse_color(cols.get('high'), DEFAULT_COLORS[2]),
+        )
+    if style == 'flat':
+        return DeviceSpec(max(0.0, gain), 1.0 / f, colors, x0, x1, curve_lut(1.0 / f, size), None)
+    step = _segment_rows(size) if style == 'segments' else 1
+    return DeviceSpec(max(0.0, gain), 1.0 / f, colors, x0, x1, curve_lut(1.0 / f, size, step, False),
+                      bar_sprite(style, size, colors, steps))
+
+
+def compile_render_plan(settings, count=None, size=ICON_SIZE, channels=None):
+    """Build an immutable RenderPlan for `count` bars (default: one per settings entry).
+
+    With `channels` (bars per device, from a per-channel meter source) each device's
+    column range is split into that many sub-bars sharing its settings; `count` is
+    then the total. Plans are cached per (settings, count, size, channels), so
+    switching sizes or settings back and forth reuses the layout, curve tables and
+    (via the renderer) palettes.
+    """
+    settings = list(settings or [])
+    n = max(1, len(settings) if count is None else count)
+    if channels is not None:
+        channels = tuple(max(1, int(c)) for c in channels)
+        n = max(1, len(channels))
+    try:
+        key = json.dumps([{k: d.get(k) for k in ('gain', 'curve', 'width', 'colors', 'style')} for d in settings],
+                         sort_keys=True)
+    except Exception:
+        return _compile_render_plan(settings, n, size, channels)
+    return _cached_render_plan(key, n, size, channels)
+
+
+@lru_cache(maxsize=32)
+def _cached_render_plan(key, n, size, channels=None):
+    return _compile_render_plan(json.loads(key), n, size, channels)
+
+
+def _channel_split(x0, x1, count):
+    # Sub-bar column ranges of one device; 1 px gaps between channels when the width allows
+    gap = 1 if x1 - x0 >= 2 * count - 1 else 0
+    ranges = []
+    x = x0
+    for w in _equal_split(count, max(0, x1 - x0 - gap * (count - 1))):
+        ranges.append((x, x + w))
+        x += w + gap
+    return ranges
+
+
+def _compile_render_plan(settings, n, size, channels=None):
+    widths = _bar_widths(settings, n, size)
+    # Palette budget: black, three colors per flat or segmented bar, the rest shared by gradient rows
+    gradients = sum(1 for d in settings[:n] if isinstance(d, dict) and d.get('style') == 'gradient')
+    steps = GRADIENT_STEPS
+    if gradients:
+        steps = max(2, min(GRADIENT_STEPS, (PALETTE_SIZE - 1 - 3 * (n - gradients)) // gradients))
+    devices = []
+    x = 0
+    for i in range(n):
+        w = widths[i]
+        spec = _compile_device(settings[i] if i < len(settings) else None, x, x + max(0, w), size, steps)
+        if channels and channels[i] > 1:
+            devices.extend(spec._replace(x0=a, x1=b) for a, b in _channel_split(spec.x0, spec.x1, channels[i]))
+        else:
+            devices.append(spec)
+        x += max(0, w)
+    return RenderPlan(size, tuple(devices))
+
+
+def create_multi_icon(levels, settings=None, plan=None):
+    from PIL import Image, ImageDraw
+    if plan is None:
+        plan = compile_render_plan(settings, max(1, len(levels)))
+    size = plan.size
+    img = Image.new('RGB', (size, size), (0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for spec, lvl in zip(plan.devices, levels):
+        if spec.x1 <= spec.x0:
+            continue
+        q = quantize_level(float(lvl))
+        h = spec.lut.heights[q]
+        if h <= 0:
+            continue
+        if spec.sprite is not None:
+            sprite = _sprite_image(spec.sprite, spec.x1 - spec.x0)
+            img.paste(sprite.crop((0, size - h, spec.x1 - spec.x0, size)), (spec.x0, size - h))
+            continue
+        draw.rectangle([spec.x0, size - h, spec.x1 - 1, size - 1], fill=spec.colors[spec.lut.colors[q]])
+    return img
+
+
+@lru_cache(maxsize=SPRITE_CACHE_SIZE)
+def _sprite_image(sprite, width):
+    # RGB image of a bar_sprite() column at `width`, top row first
+    from PIL import Image
+    size = len(sprite)
+    data = bytearray()
+    for rgb in reversed(sprite):
+        data += bytes(rgb or (0, 0, 0)) * width
+    return Image.frombytes('RGB', (width, size), bytes(data))
+
+
+class DrawRenderer:
+    """Reference renderer: draws a fresh RGB image with ImageDraw every frame."""
+
+    def __init__(self, plan):
+        self.plan = plan
+
+    def render(self, levels):
+        return create_multi_icon(levels, plan=self.plan)
+
+
+# runs[i]: row segment of bar i in each of its three colors; sprites[i]: None for flat bars,
+# else the bar's sprite as palette indices, `size` rows of its width, top row first
+FrameBufferLayout = namedtuple('FrameBufferLayout', ('palette', 'runs', 'blank_row', 'sprites'))
+
+
+@lru_cache(maxsize=16)
+def _framebuffer_layout(plan):
+    # Palette index 0 is the black background; device colors are deduplicated after it
+    palette = [(0, 0, 0)]
+    slots = {(0, 0, 0): 0}
+
+    def slot(color):
+        if color not in slots:
+            slots[color] = len(palette)
+            palette.append(color)
+        return slots[color]
+
+    runs = []
+    sprites = []
+    for spec in plan.devices:
+        w = max(0, spec.x1 - spec.x0)
+        if spec.sprite is not None:
+            # Gap rows of segments stay background
+            block = b''.join(bytes([slot(rgb) if rgb else 0]) * w for rgb in reversed(spec.sprite))
+            sprites.append(block)
+            runs.append(None)
+            continue
+        sprites.append(None)
+        # One pre-built row segment of this bar in this color
+        runs.append(tuple(bytes([slot(color)]) * w for color in spec.colors))
+    if len(palette) > PALETTE_SIZE:
+        raise ValueError('too many distinct colors for a palette framebuffer')
+    return FrameBufferLayout(bytes(c for rgb in palette for c in rgb), tuple(runs), bytes(plan.size), tuple(sprites))
+
+
+class FrameBufferRenderer:
+    """Renders into one preallocated palette ("P") framebuffer that Pillow reads in place.
+
+    The image returned by render() is the same object every frame; only the bytes
+    behind it change, so no image or draw objects are allocated per tick. Rows only
+    change where a bar starts, so each frame is built band by band: one row edit per
+    bar, then the band is filled by doubling copies. The Python work per frame depends
+    on the number of bars, not on the icon size.
+    """
+
+    def __init__(self, plan):
+        from PIL import Image, ImagePalette
+        size = plan.size
+        self.plan = plan
+        layout = _framebuffer_layout(plan)
+        self._runs = layout.runs
+        self._sprites = tuple(memoryview(s) if s is not None else None for s in layout.sprites)
+        self.buffer = bytearray(size * size)
+        self._view = memoryview(self.buffer)
+        self._row = bytearray(size)
+        self._row_view = memoryview(self._row)
+        self._blank_row = layout.blank_row
+        self.image = Image.frombuffer('P', (size, size), self.buffer, 'raw', 'P', 0, 1)
+        self.image.palette = ImagePalette.ImagePalette('RGB', layout.palette)
+        self.image.palette.dirty = 1
+
+    def _fill(self, top, bottom):
+        # Copy self._row into rows [top, bottom) with O(log rows) slice copies
+        if bottom <= top:
+            return
+        size = self.plan.size
+        view = self._view
+        start = top * size
+        view[start:start + size] = self._row_view
+        filled = size
+        total = (bottom - top) * size
+        while filled < total:
+            k = min(filled, total - filled)
+            view[start + filled:start + filled + k] = view[start:start + k]
+            filled += k
+
+    def render(self, levels):
+        size = self.plan.size
+        row = self._row_view
+        row[:] = self._blank_row
+        bars = []
+        styled = []
+        for spec, runs, sprite, lvl in zip(self.plan.devices, self._runs, self._sprites, levels):
+            if spec.x1 <= spec.x0:
+                continue
+            q = quantize_level(float(lvl))
+            h = spec.lut.heights[q]
+            if h <= 0:
+                continue
+            if sprite is not None:
+                styled.append((h, spec.x0, spec.x1, sprite))
+            else:
+                bars.append((h, spec.x0, spec.x1, runs[spec.lut.colors[q]]))
+        # Tallest first: walking down the image, each bar lights up at its top row and stays lit
+        bars.sort(reverse=True)
+        y = 0
+        for h, x0, x1, run in bars:
+            top = size - h
+            self._fill(y, top)
+            y = max(y, top)
+            row[x0:x1] = run
+        self._fill(y, size)
+        # Styled bars copy the bottom h rows of their sprite, one row slice each (as flat bars used to)
+        view = self._view
+        for h, x0, x1, sprite in styled:
+            w = x1 - x0
+            src = (size - h) * w
+            for off in range((size - h) * size + x0, size * size, size):
+                view[off:off + w] = sprite[src:src + w]
+                src += w
+        return self.image
+
+
+class NumpyRenderer:
+    """Vectorized renderer for many bars; needs NumPy (ImportError otherwise).
+
+    All levels are quantized in one pass and looked up in per-bar (height, palette
+    index) tables; each column takes its bar's values, and the frame is one comparison
+    of a precomputed row grid against the column heights. The palette-index frame is a
+    preallocated array that Pillow reads in place, like FrameBufferRenderer.
+    """
+
+    def __init__(self, plan):
+        import numpy as np
+        from PIL import Image, ImagePalette
+        self.np = np
+        self.plan = plan
+        size = plan.size
+        layout = _framebuffer_layout(plan)
+        n = len(plan.devices)
+        # Row index counted from the bottom, per pixel; a pixel is lit when it is below its column's bar height
+        self._grid = np.repeat(np.arange(size - 1, -1, -1, dtype=np.int16)[:, None], size, axis=1)
+        # Column -> bar; columns no bar covers map to an extra always-empty bar n
+        col_bar = np.full(size, n, dtype=np.intp)
+        heights = np.zeros((n + 1, CURVE_LUT_SIZE), dtype=np.int16)
+        colors = np.zeros((n + 1, CURVE_LUT_SIZE), dtype=np.uint8)
+        # Styled bars: palette index per pixel of their columns (sprite rows), 0 elsewhere
+        sprite_grid = np.zeros((size, size), dtype=np.uint8)
+        for i, (spec, runs, sprite) in enumerate(zip(plan.devices, layout.runs, layout.sprites)):
+            if spec.x1 <= spec.x0:
+                continue
+            col_bar[spec.x0:spec.x1] = i
+            heights[i] = np.frombuffer(spec.lut.heights, dtype=np.uint8)
+            if sprite is not None:
+                w = spec.x1 - spec.x0
+                sprite_grid[:, spec.x0:spec.x1] = np.frombuffer(sprite, dtype=np.uint8).reshape(size, w)
+                continue
+            # Palette slot of each of the bar's three colors, indexed by the LUT's color class
+            slots = np.array([r[0] for r in runs], dtype=np.uint8)
+            colors[i] = slots[np.frombuffer(spec.lut.colors, dtype=np.uint8)]
+        self._sprite_grid = sprite_grid if any(sp is not None for sp in layout.sprites) else None
+        self._sprite_frame = np.zeros((size, size), dtype=np.uint8) if self._sprite_grid is not None else None
+        self._col_bar = col_bar
+        self._heights = heights
+        self._colors = colors
+        self._levels = np.zeros(n + 1, dtype=np.float64)
+        self._q = np.zeros(n + 1, dtype=np.intp)
+        self._mask = np.zeros((size, size), dtype=bool)
+        self.frame = np.zeros((size, size), dtype=np.uint8)
+        self._bars = np.arange(n + 1)
+        self.image = Image.frombuffer('P', (size, size), self.frame, 'raw', 'P', 0, 1)
+        self.image.palette = ImagePalette.ImagePalette('RGB', layout.palette)
+        self.image.palette.dirty = 1
+
+    def render(self, levels):
+        np = self.np
+        lv = self._levels
+        # Levels can be short of the plan for a frame (device count changing): missing bars are empty
+        n = min(len(self.plan.devices), len(levels))
+        lv[:n] = levels[:n]
+        lv[n:] = 0.0
+        # Same quantization as quantize_level(): clamp to [0, 1], NaN reads as 0
+        np.nan_to_num(lv, copy=False, nan=0.0)
+        np.clip(lv, 0.0, 1.0, out=lv)
+        q = self._q
+        np.multiply(lv, CURVE_LUT_SIZE - 1, out=lv)
+        np.add(lv, 0.5, out=lv)
+        q[:] = lv
+        h = self._heights[self._bars, q]
+        c = self._colors[self._bars, q]
+        cols = self._col_bar
+        np.less(self._grid, h[cols], out=self._mask)
+        np.multiply(self._mask, c[cols], out=self.frame)
+        if self._sprite_grid is not None:
+            # Flat bars' color tables are 0 in styled columns and vice versa, so the two add up
+            np.multiply(self._mask, self._sprite_grid, out=self._sprite_frame)
+            np.add(self.frame, self._sprite_frame, out=self.frame)
+        return self.image
+
+
+def frame_key(plan, levels):
+    """Quantized (height, color index) pairs for every bar; equal keys render identical icons."""
+    key = bytearray()
+    for spec, lvl in zip(plan.devices, levels):
+        q = quantize_level(float(lvl))
+        h = spec.lut.heights[q]
+        key.append(h)
+        key.append(spec.lut.colors[q] if h else 0)
+    return bytes(key)
+
+
+RENDERERS = {
+    'framebuffer': FrameBufferRenderer,
+    'draw': DrawRenderer,
+    'numpy': NumpyRenderer,
+}
+
+
+# 'auto' uses the NumPy renderer from this many visible bars on (render-only crossover measured
+# with --bench: ~8 bars at 64 px, ~12 at 32 px; below that its fixed per-call cost dominates)
+AUTO_NUMPY_MIN_BARS = 12
+# ... or from this many sprite rows (styled bars x icon size): FrameBufferRenderer copies
+# styled bars row by row (~8 bars at 32 px, ~4 at 64 px)
+AUTO_NUMPY_MIN_SPRITE_ROWS = 192
+
+
+def make_renderer(plan, mode='framebuffer'):
+    if mode == 'auto':
+        visible = [spec for spec in plan.devices if spec.x1 > spec.x0]
+        sprite_rows = plan.size * sum(1 for spec in visible if spec.sprite is not None)
+        many = len(visible) >= AUTO_NUMPY_MIN_BARS or sprite_rows >= AUTO_NUMPY_MIN_SPRITE_ROWS
+        mode = 'numpy' if many else 'framebuffer'
+    try:
+        return RENDERERS[mode](plan)
+    except ImportError:
+        # Optional backend (NumPy) not installed
+        return make_renderer(plan, 'framebuffer')
+    except ValueError:
+        # e.g. more distinct colors than a palette can hold
+        return DrawRenderer(plan)
+
+
+# Default span of the level history view (--history without a value)
+HISTORY_SECONDS = 10.0
+
+
+class HistoryRenderer:
+    """Scrolling level history: one lane per device, the newest column at the right edge.
+
+    Lanes split the icon height in device order and use each device's curve and
+    low/mid/high colors. A column covers `seconds / size` and shows the peak level of
+    the frames in it. When columns are due, the palette framebuffer is shifted left
+    in place with one memmove and only the new columns are written, so the cost per
+    frame does not depend on how much history is shown. Each device's history is also
+    kept in a fixed-size float ring, which redraws the icon when settings change.
+    """
+
+    def __init__(self, plan, seconds=HISTORY_SECONDS, rings=None, clock=time.monotonic):
+        from PIL import Image, ImagePalette
+        self.plan = plan
+        size = plan.size
+        n = len(plan.devices)
+        self.clock = clock
+        self.column_period = max(0.001, float(seconds)) / size
+        palette = [(0, 0, 0)]
+        slots = {(0, 0, 0): 0}
+        lanes = []
+        for spec, h in zip(plan.devices, _equal_split(n, size) if n else []):
+            lut = curve_lut(spec.exponent, h)
+            idx = []
+            for color in spec.colors:
+                if color not in slots:
+                    slots[color] = len(palette)
+                    palette.append(color)
+                idx.append(slots[color])
+            # Lane column for every height and color class, top row first
+            cols = tuple(tuple(bytes(h - k) + bytes([c]) * k for c in idx) for k in range(h + 1))
+            lanes.append((lut, cols))
+        if len(palette) > PALETTE_SIZE:
+            raise ValueError('too many distinct colors for a palette framebuffer')
+        self._lanes = lanes
+        self.buffer = bytearray(size * size)
+        self._cbuf = (ctypes.c_char * len(self.buffer)).from_buffer(self.buffer)
+        self._addr = ctypes.addressof(self._cbuf)
+        if rings is None or len(rings) != n or any(len(r) != size for r in rings):
+            rings = [array('f', bytes(4 * size)) for _ in range(n)]
+        # rings[i][pos] is the newest column of device i; given rings are oldest first
+        self.rings = rings
+        self.pos = size - 1
+        self._peak = [0.0] * n
+        self._columns = 0
+        self._due = 0
+        self._start = clock()
+        self.image = Image.frombuffer('P', (size, size), self.buffer, 'raw', 'P', 0, 1)
+        self.image.palette = ImagePalette.ImagePalette('RGB', bytes(c for rgb in palette for c in rgb))
+        self.image.palette.dirty = 1
+        for x in range(size):
+            self._write_column(x, [r[(self.pos + 1 + x) % size] for r in rings])
+
+    def history(self):
+        """Per-device levels of the shown columns, oldest first."""
+        start = self.pos + 1
+        return [r[start:] + r[:start] for r in self.rings]
+
+    def _write_column(self, x, values):
+        parts = []
+        for (lut, cols), lvl in zip(self._lanes, values):
+            q = quantize_level(lvl)
+            parts.append(cols[lut.heights[q]][lut.colors[q]])
+        size = self.plan.size
+        self.buffer[x::size] = b''.join(parts)
+
+    def advance(self, levels):
+        """Take one frame's levels; returns a key that changes whenever new columns are due."""
+        peak = self._peak
+        for i, lvl in enumerate(levels[:len(peak)]):
+            if lvl > peak[i]:
+                peak[i] = lvl
+        total = int((self.clock() - self._start) / self.column_period)
+        if total > self._columns:
+            self._due += total - self._columns
+            self._columns = total
+        return self._columns
+
+    def render(self, levels):
+        due, self._due = min(self._due, self.plan.size), 0
+        if due:
+            size = self.plan.size
+            peak, self._peak = self._peak, [0.0] * len(self._peak)
+            # Row r's first columns land at the end of row r - 1; the new columns overwrite them
+            ctypes.memmove(self._addr, self._addr + due, len(self.buffer) - due)
+            for ring, lvl in zip(self.rings, peak):
+                for k in range(due):
+                    ring[(self.pos + 1 + k) % size] = lvl
+            self.pos = (self.pos + due) % size
+            for x in range(size - due, size):
+                self._write_column(x, peak)
+        return self.image
+
+
+# --- Meter sources ---
+
+class MeterSource:
+    """Supplies one raw peak level (0..1) per device to the worker loop.
+
+    open() and close() are called on the worker thread, so COM-based sources can
+    set up their apartment there. read() returns a list of `count` floats.
+    A per-channel source sets `channels` to the number of values of each device
+    (summing to `count`) once open; None means one value per device.
+    """
+
+    count = 0
+    channels = None
+
+    def open(self):
+        pass
+
+    def read(self):
+        raise NotImplementedError
+
+    def set_endpoints(self, endpoint_ids):
+        """Follow a new device selection while open; sources not backed by endpoints keep their bars."""
+        pass
+
+    def close(self):
+        pass
+
+
+# Meter health: backoff between re-activation attempts, and what counts as a stalling endpoint
+METER_RETRY_INITIAL = 0.5
+METER_RETRY_MAX = 30.0
+METER_SLOW_READ_S = 0.025
+METER_SLOW_STRIKES = 3
+# How long close() waits for each meter's poller thread to finish its current read
+METER_POLLER_JOIN_S = 0.1
+
+
+class _MeterSlot:
+    """Health of one selected endpoint: 'ok', 'recovering' (re-activation pending) or 'removed'."""
+
+    __slots__ = ('eid', 'poller', 'read_fn', 'values', 'state', 'epoch', 'slow', 'read_time', 'channels', 'peaks',
+                 'backoff', 'ok_since')
+
+    def __init__(self, eid):
+        self.eid = eid
+        # _MeterPoller that owns the activated meter (None while recovering)
+        self.poller = None
+        # What the poller runs per frame: meter -> list of `channels` levels
+        self.read_fn = None
+        # Levels of the last completed read; a bar whose read is late keeps them
+        self.values = None
+        # Per-channel mode: bars of this device (fixed once known) and the meter's peak buffer
+        self.channels = 1
+        self.peaks = None
+        self.state = 'recovering'
+        # Bumped on every failure so a late re-activation of an older episode is discarded
+        self.epoch = 0
+        self.slow = 0
+        self.read_time = frame_metrics.device(eid)
+        # Delay before the next re-activation attempt; kept across failure episodes so an
+        # endpoint that keeps failing soon after coming back is retried less and less often
+        self.backoff = METER_RETRY_INITIAL
+        # When the current meter was attached (None while recovering)
+        self.ok_since = None
+
+
+def _peak_value(meter):
+    return [meter.GetPeakValue()]
+
+
+class _MeterPoller(threading.Thread):
+    """Reads one meter on its own thread, one read per request().
+
+    The thread owns the meter: it releases it on exit, so a meter whose call hangs
+    is never released under it. retire() lets the thread exit after its current read;
+    one stuck in a call that never returns stays parked there, with only its own bar.
+    """
+
+    def __init__(self, source, meter):
+        super().__init__(name='MeterPoller', daemon=True)
+        self.source = source
+        self.meter = meter
+        self.fn = _peak_value
+        self.result = None
+        self.error = None
+        self.elapsed = 0.0
+        self.done = threading.Event()
+        self.done.set()
+        self._go = threading.Event()
+        self._retired = False
+
+    def request(self, fn):
+        """Start one read with fn(meter); the previous one must be done."""
+        self.fn = fn
+        self.done.clear()
+        self._go.set()
+
+    def retire(self):
+        self._retired = True
+        self._go.set()
+
+    def run(self):
+        perf = time.perf_counter
+        self.source._com_init()
+        try:
+            while True:
+                self._go.wait()
+                self._go.clear()
+                if self._retired:
+                    break
+                t0 = perf()
+                try:
+                    self.result = self.fn(self.meter)
+                    self.error = None
+                except Exception as e:
+                    self.result = None
+                    self.error = e
+                self.elapsed = perf() - t0
+                self.done.set()
+        finally:
+            self.source._release(self.meter)
+            self.meter = None
+            self.source._com_uninit()
+
+
+class PycawMeterSource(MeterSource):
+    """Live endpoint peaks via IAudioMeterInformation::GetPeakValue.
+
+    Each activated meter is read on its own poller thread: read() starts every
+    endpoint's read at once and waits for them until METER_SLOW_READ_S has passed,
+    so a slow or hung endpoint never holds up the other bars. A read that is late
+    leaves its bar at its previous level and is not restarted until it completes.
+    A meter whose read fails, or is late or slow several frames in a row, reads as
+    0.0 and is handed to a recovery thread that re-activates the endpoint with
+    exponential backoff; the new meter is swapped in on a later read() only if its
+    probe reads, made on its own poller, were fast. The backoff only resets after
+    a meter stayed healthy for METER_RETRY_MAX seconds. All these threads join the
+    COM multithreaded apartment so meters can move between them.
+
+    With `per_channel`, each device yields one value per channel: the channel count
+    comes from GetMeteringChannelCount() at activation, and every read fetches all
+    channels with one GetChannelsPeakValues() call into the slot's preallocated
+    c_float array. A device's bar count is fixed when first known; if a re-activated
+    meter reports a different count, all of its bars show the device peak.
+    """
+
+    def __init__(self, endpoint_ids, per_channel=False):
+        self.endpoint_ids = list(endpoint_ids)
+        self.count = len(self.endpoint_ids)
+        self.per_channel = per_channel
+        self._enumerator = None
+        self._slots = []
+        self._retry_q = queue.SimpleQueue()
+        self._recovered = deque()
+        self._stop = threading.Event()
+        self._recovery = None
+        self.read_errors = 0
+        self.reactivations = 0
+
+    # COM plumbing, one call per step so the health logic can run against fakes
+
+    def _com_init(self):
+        comtypes.CoInitializeEx(comtypes.COINIT_MULTITHREADED)
+
+    def _com_uninit(self):
+        try:
+            comtypes.CoUninitialize()
+        except Exception:
+            pass
+
+    def _create_enumerator(self):
+        return comtypes.CoCreateInstance(
+            CLSID_MMDeviceEnumerator,
+            IMMDeviceEnumerator,
+            CLSCTX_ALL
+        )
+
+    def _activate(self, enumerator, eid):
+        dev = enumerator.GetDevice(eid)
+        m = dev.Activate(IAudioMeterInformation._iid_, CLSCTX_ALL, None)
+        return cast(m, POINTER(IAudioMeterInformation))
+
+    @staticmethod
+    def _channel_peaks(meter, peaks):
+        # Raw vtable call: fills the caller's array, no output buffer allocated per read
+        meter._IAudioMeterInformation__com_GetChannelsPeakValues(len(peaks), peaks)
+
+    def _start_poller(self, meter):
+        poller = _MeterPoller(self, meter)
+        poller.start()
+        return poller
+
+    def _attach(self, slot, poller, first=False):
+        # Put a polled meter in the slot; per channel, size its peak buffer
+        if self.per_channel:
+            n = max(1, int(poller.meter.GetMeteringChannelCount()))
+            if slot.peaks is None or len(slot.peaks) != n:
+                slot.peaks = (ctypes.c_float * n)()
+            if first:
+                slot.channels = n
+            slot.read_fn = self._channel_reader(slot.peaks, slot.channels)
+        else:
+            slot.read_fn = _peak_value
+        slot.values = [0.0] * slot.channels
+        slot.poller = poller
+        slot.state = 'ok'
+        slot.ok_since = time.monotonic()
+
+    def _channel_reader(self, peaks, channels):
+        channel_peaks = self._channel_peaks
+
+        def read(meter):
+            channel_peaks(meter, peaks)
+            if len(peaks) == channels:
+                return list(peaks)
+            return [max(peaks)] * channels
+        return read
+
+    def _update_channels(self):
+        self.count = sum(slot.channels for slot in self._slots)
+        self.channels = [slot.channels for slot in self._slots] if self.per_channel else None
+
+    @staticmethod
+    def _release(obj):
+        if obj is not None:
+            try:
+                obj.Release()
+            except Exception:
+                pass
+
+    def open(self):
+        # Initialize COM and activate meters for each endpoint in this thread
+        self._com_init()
+        self._enumerator = self._create_enumerator()
+        self._stop.clear()
+        self._recovery = threading.Thread(target=self._recover_loop, name='MeterRecovery', daemon=True)
+        self._recovery.start()
+        self._slots = []
+        for eid in self.endpoint_ids:
+            slot = _MeterSlot(eid)
+            self._open_slot(slot)
+            self._slots.append(slot)
+        self._update_channels()
+
+    def _open_slot(self, slot, delay=METER_RETRY_INITIAL):
+        poller = None
+        try:
+            poller = self._start_poller(self._activate(self._enumerator, slot.eid))
+            self._attach(slot, poller, first=True)
+        except Exception:
+            # Unplugged or unknown endpoint: keep its bar at 0.0 and retry in the background
+            if poller is not None:
+                poller.retire()
+            slot.poller = None
+            self._retry_q.put((slot, slot.epoch, delay))
+
+    def _fail(self, slot):
+        poller, slot.poller = slot.poller, None
+        if poller is not None:
+            # The poller releases the meter once its current read returns, in case that is slow too
+            poller.retire()
+        if slot.ok_since is not None and time.monotonic() - slot.ok_since >= METER_RETRY_MAX:
+            # Healthy for a long while: this is a new problem, not the previous one recurring
+            slot.backoff = METER_RETRY_INITIAL
+        delay = slot.backoff
+        slot.backoff = min(METER_RETRY_MAX, delay * 2)
+        slot.ok_since = None
+        slot.state = 'recovering'
+        slot.epoch += 1
+        slot.slow = 0
+        self._retry_q.put((slot, slot.epoch, delay))
+
+    def _recover_loop(self):
+        self._com_init()
+        enumerator = None
+        due = []  # [when, slot, epoch]
+        try:
+            enumerator = self._create_enumerator()
+            while not self._stop.is_set():
+                now = time.monotonic()
+                timeout = max(0.0, min(d[0] for d in due) - now) if due else None
+                try:
+                    item = self._retry_q.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if item is not None:
+                    slot, epoch, delay = item
+                    due.append([time.monotonic() + delay, slot, epoch])
+                now = time.monotonic()
+                for entry in list(due):
+                    when, slot, epoch = entry
+                    if slot.epoch != epoch or slot.state != 'recovering':
+                        due.remove(entry)
+                        continue
+                    if when > now or self._stop.is_set():
+                        continue
+                    poller = None
+                    try:
+                        poller = self._start_poller(self._activate(enumerator, slot.eid))
+                        # A meter that answers slowly (or not at all) would stall its bar again once swapped in
+                        if not self._probe(poller):
+                            raise TimeoutError('slow meter read')
+                    except Exception:
+                        if poller is not None:
+                            poller.retire()
+                        entry[0] = time.monotonic() + slot.backoff
+                        slot.backoff = min(METER_RETRY_MAX, slot.backoff * 2)
+                        continue
+                    due.remove(entry)
+                    self._recovered.append((slot, epoch, poller))
+        except Exception:
+            pass
+        finally:
+            self._release(enumerator)
+            self._com_uninit()
+
+    @staticmethod
+    def _probe(poller):
+        # A few reads as the worker would make them on consecutive frames, on the meter's own
+        # poller so a hung endpoint cannot block the recovery of the others
+        for _ in range(METER_SLOW_STRIKES):
+            poller.request(_peak_value)
+            if not poller.done.wait(METER_SLOW_READ_S) or poller.error is not None:
+                return False
+            if poller.elapsed > METER_SLOW_READ_S:
+                return False
+        return True
+
+    def set_endpoints(self, endpoint_ids):
+        # Keep meters for endpoints still selected; new ones are activated by the recovery thread
+        current = {}
+        for slot in self._slots:
+            current.setdefault(slot.eid, []).append(slot)
+        slots = []
+        for eid in endpoint_ids:
+            kept = current.get(eid)
+            if kept:
+                slots.append(kept.pop(0))
+                continue
+            slot = _MeterSlot(eid)
+            if self.per_channel:
+                # Activate here (worker thread) so the new plan already has this device's channels
+                self._open_slot(slot, 0.0)
+            else:
+                self._retry_q.put((slot, slot.epoch, 0.0))
+            slots.append(slot)
+        for leftovers in current.values():
+            for slot in leftovers:
+                slot.state = 'removed'
+                if slot.poller is not None:
+                    slot.poller.retire()
+                    slot.poller = None
+        self.endpoint_ids = list(endpoint_ids)
+        self._slots = slots
+        self._update_channels()
+
+    def health(self):
+        """Per-device state in bar order: 'ok' or 'recovering'."""
+        return [slot.state for slot in self._slots]
+
+    def read(self):
+        # Swap in meters the recovery thread brought back since the last frame
+        while self._recovered:
+            slot, epoch, poller = self._recovered.popleft()
+            if slot.epoch == epoch and slot.state == 'recovering':
+                try:
+                    self._attach(slot, poller)
+                except Exception:
+                    poller.retire()
+                    self._fail(slot)
+                    continue
+                self.reactivations += 1
+                frame_metrics.reactivations += 1
+            else:
+                poller.retire()
+        slots = self._slots
+        # Start every endpoint's read before waiting for any; one still busy with an earlier read is late
+        late = []
+        for slot in slots:
+            poller = slot.poller
+            if poller is None:
+                late.append(False)
+            elif poller.done.is_set():
+                poller.request(slot.read_fn)
+                late.append(False)
+            else:
+                late.append(True)
+        perf = time.perf_counter
+        deadline = perf() + METER_SLOW_READ_S
+        levels = []
+        for slot, was_late in zip(slots, late):
+            poller = slot.poller
+            if poller is None:
+                levels.extend([0.0] * slot.channels)
+                continue
+            # A read already late is not waited for again: only its own bar waits for it
+            if not poller.done.wait(0.0 if was_late else max(0.0, deadline - perf())):
+                self._strike(slot)
+                levels.extend(slot.values if slot.poller is not None else [0.0] * slot.channels)
+                continue
+            slot.read_time.add(poller.elapsed)
+            if poller.error is not None:
+                self.read_errors += 1
+                frame_metrics.read_errors += 1
+                self._fail(slot)
+                levels.extend([0.0] * slot.channels)
+                continue
+            slot.values = poller.result
+            if poller.elapsed > METER_SLOW_READ_S:
+                self._strike(slot)
+            else:
+                slot.slow = 0
+            levels.extend(slot.values)
+        return levels
+
+    def _strike(self, slot):
+        # A stalling endpoint is taken off the loop once it has been slow several frames in a row
+        slot.slow += 1
+        if slot.slow >= METER_SLOW_STRIKES:
+            self._fail(slot)
+
+    def close(self):
+        self._stop.set()
+        self._retry_q.put(None)
+        if self._recovery is not None:
+            self._recovery.join(0.5)
+            self._recovery = None
+        # Pollers release their meters on their own threads, while their apartments are initialized
+        pollers = [slot.poller for slot in self._slots if slot.poller is not None]
+        for slot in self._slots:
+            slot.poller = None
+        while self._recovered:
+            pollers.append(self._recovered.popleft()[2])
+        for poller in pollers:
+            poller.retire()
+        for poller in pollers:
+            poller.join(METER_POLLER_JOIN_S)
+        self._release(self._enumerator)
+        self._enumerator = None
+        self._com_uninit()
+
+
+class SyntheticMeterSource(MeterSource):
+    """Deterministic generated levels: 'sine', 'bursts' or 'noise'.
+
+    Each read() advances a virtual clock by `interval` seconds, so a given
+    (pattern, count, seed) always yields the same sequence.
+    """
+
+    PATTERNS = ('sine', 'bursts', 'noise')
+
+    def __init__(self, count=1, pattern='sine', seed=0, interval=0.05):
+        if pattern not in self.PATTERNS:
+            raise ValueError(f'unknown synthetic pattern: {pattern}')
+        self.count = max(1, int(count))
+        self.pattern = pattern
+        self.seed = seed
+        self.interval = interval
+        self.open()
+
+    def open(self):
+        self._step = 0
+        self._rng = random.Random(self.seed)
+
+    def read(self):
+        t = self._step * self.interval
+        self._step += 1
+        n = self.count
+        if self.pattern == 'sine':
+            # 2 s period, phase-shifted per device
+            return [0.5 + 0.5 * math.sin(math.pi * t + 2.0 * math.pi * i / n) for i in range(n)]
+        if self.pattern == 'bursts':
+            # 0.3 s decaying burst at the start of each period, silence in between
+            levels = []
+            for i in range(n):
+                phase = t % (1.0 + 0.1 * i)
+                levels.append(0.9 * (1.0 - phase / 0.3) if phase < 0.3 else 0.0)
+            return levels
+        rnd = self._rng.random
+        return [rnd() ** 2 for _ in range(n)]
+
+
+class _FakeChannelMeter:
+    """Stand-in for an IAudioMeterInformation pointer, with synthetic per-channel peaks."""
+
+    def __init__(self, channels, pattern):
+        self._levels = SyntheticMeterSource(channels, pattern)
+        self.channels = channels
+
+    def GetMeteringChannelCount(self):
+        return self.channels
+
+    def GetPeakValue(self):
+        return max(self._levels.read())
+
+    def _IAudioMeterInformation__com_GetChannelsPeakValues(self, count, peaks):
+        if count != self.channels:
+            raise ValueError('E_INVALIDARG')
+        for i, lvl in enumerate(self._levels.read()):
+            peaks[i] = lvl
+        return 0
+
+    def Release(self):
+        pass
+
+
+class _FakeEnumerator:
+    def Release(self):
+        pass
+
+
+class FakeEndpointMeterSource(PycawMeterSource):
+    """PycawMeterSource over fake endpoints with the given channel counts, for testing without Windows.
+
+    Only the COM plumbing is replaced, so activation, per-channel reads and recovery
+    run the same code as with live endpoints. Its endpoints stay fixed across
+    set_endpoints(), like the other sources not backed by real devices.
+    """
+
+    def __init__(self, channels=(2,), pattern='sine', per_channel=True):
+        self.fake_channels = [max(1, int(c)) for c in channels] or [2]
+        self.pattern = pattern
+        super().__init__([f'fake:{i}' for i in range(len(self.fake_channels))], per_channel)
+
+    def _com_init(self):
+        pass
+
+    def _com_uninit(self):
+        pass
+
+    def _create_enumerator(self):
+        return _FakeEnumerator()
+
+    def _activate(self, enumerator, eid):
+        return _FakeChannelMeter(self.fake_channels[int(eid.split(':')[1])], self.pattern)
+
+    def set_endpoints(self, endpoint_ids):
+        pass
+
+
+def _pcm_peaks(data, sample_width, channels):
+    """Per-channel absolute peak (0..1) of interleaved little-endian integer PCM."""
+    if sample_width == 1:
+        samples = array('B', data)
+        bias, full = 128, 128.0
+    elif sample_width in (2, 4):
+        samples = array('h' if sample_width == 2 else 'i')
+        usable = len(data) - len(data) % sample_width
+        samples.frombytes(data[:usable])
+        if sys.byteorder == 'big':
+            samples.byteswap()
+        bias, full = 0, float(1 << (8 * sample_width - 1))
+    else:
+        raise ValueError(f'unsupported sample width: {sample_width}')
+    peaks = []
+    for ch in range(channels):
+        col = samples[ch::channels]
+        if not col:
+            peaks.append(0.0)
+            continue
+        peaks.append(min(1.0, max(max(col) - bias, bias - min(col)) / full))
+    return peaks
+
+
+class WavFileMeterSource(MeterSource):
+    """Block peaks of a PCM WAV file; device i shows channel i modulo the file's channel count.
+
+    Each read() consumes `interval` seconds of audio, looping at the end when `loop` is set.
+    """
+
+    def __init__(self, path, count=None, interval=0.05, loop=True):
+        self.path = path
+        self.interval = interval
+        self.loop = loop
+        with wave.open(path, 'rb') as w:
+            self.channels = w.getnchannels()
+            self.sample_width = w.getsampwidth()
+            self.block = max(1, int(round(w.getframerate() * interval)))
+        if self.sample_width not in (1, 2, 4):
+            raise ValueError(f'unsupported WAV sample width: {self.sample_width}')
+        self.count = count or self.channels
+        self._wav = None
+
+    def open(self):
+        self._wav = wave.open(self.path, 'rb')
+
+    def read(self):
+        data = self._wav.readframes(self.block)
+        if len(data) < self.block * self.channels * self.sample_width and self.loop:
+            self._wav.rewind()
+            data += self._wav.readframes(self.block - len(data) // (self.channels * self.sample_width))
+        peaks = _pcm_peaks(data, self.sample_width, self.channels)
+        return [peaks[i % self.channels] for i in range(self.count)]
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+
+# How often a FIFO reader waiting for data checks whether its source was closed
+FIFO_POLL_S = 0.1
+
+
+class FifoMeterSource(MeterSource):
+    """Raw interleaved signed little-endian PCM from a FIFO, pipe or '-' for stdin.
+
+    A reader thread keeps the per-channel peak since the previous read(); reads never block.
+    close() stops the reader and closes the FIFO before returning, so a restarted source
+    is the only reader of the pipe. Where select() cannot wait on pipes (Windows) a reader
+    blocked on a silent pipe gives up its file from close() instead.
+    """
+
+    def __init__(self, path, channels=1, sample_width=2, count=None, chunk_frames=1024):
+        if sample_width not in (2, 4):
+            raise ValueError(f'unsupported sample width: {sample_width}')
+        self.path = path
+        self.channels = max(1, int(channels))
+        self.sample_width = sample_width
+        self.count = count or self.channels
+        self.chunk = chunk_frames * self.channels * sample_width
+        self._peaks = [0.0] * self.channels
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._reader = None
+        self._fd = None
+        self._owns_fd = False
+
+    def open(self):
+        self._closed.clear()
+        self._reader = threading.Thread(target=self._pump, daemon=True)
+        self._reader.start()
+
+    def _open_fd(self):
+        if self.path == '-':
+            return sys.stdin.fileno(), False
+        if os.name == 'nt':
+            return os.open(self.path, os.O_RDONLY | getattr(os, 'O_BINARY', 0)), True
+        # Non-blocking so opening does not wait for a writer; select() below does the waiting
+        fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        os.set_blocking(fd, True)
+        return fd, True
+
+    def _pump(self):
+        try:
+            fd, owns = self._open_fd()
+        except OSError:
+            return
+        with self._lock:
+            if self._closed.is_set():
+                if owns:
+                    os.close(fd)
+                return
+            self._fd, self._owns_fd = fd, owns
+        waitable = os.name != 'nt'
+        frame = self.channels * self.sample_width
+        tail = b''
+        try:
+            while not self._closed.is_set():
+                if waitable and not select.select([fd], [], [], FIFO_POLL_S)[0]:
+                    continue
+                data = os.read(fd, self.chunk)
+                if not data:
+                    break
+                data = tail + data
+                usable = len(data) - len(data) % frame
+                tail = data[usable:]
+                peaks = _pcm_peaks(data[:usable], self.sample_width, self.channels)
+                with self._lock:
+                    self._peaks = [max(a, b) for a, b in zip(self._peaks, peaks)]
+        except OSError:
+            # The file was closed under a blocked read by close()
+            pass
+        finally:
+            self._release_fd()
+
+    def _release_fd(self):
+        with self._lock:
+            fd, owns = self._fd, self._owns_fd
+            self._fd = None
+        if fd is not None and owns:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def read(self):
+        with self._lock:
+            peaks, self._peaks = self._peaks, [0.0] * self.channels
+        return [peaks[i % self.channels] for i in range(self.count)]
+
+    def close(self):
+        self._closed.set()
+        reader, self._reader = self._reader, None
+        if reader is None:
+            return
+        reader.join(2 * FIFO_POLL_S)
+        if reader.is_alive():
+            # Still blocked in open() or read(): closing the file lets it return
+            self._release_fd()
+            reader.join(2 * FIFO_POLL_S)
+
+
+# Meter trace recordings. Layout (little-endian):
+#    0  char[8]   magic b'VUREC\x00\x00\x01'
+#    8  uint32    count: levels per record
+#   12  uint32    length of the JSON endpoint id list that follows the fixed header
+#   16  float64   nominal sample rate in Hz (records per second)
+#   24  float64   wall-clock start time (time.time())
+#   32  char[n]   UTF-8 JSON list of endpoint ids, NUL padded to a multiple of 8
+#   ... records: float64 seconds since start + float32[count] raw levels
+# A record that was cut short (crash, still being written) is ignored by readers.
+RECORD_MAGIC = b'VUREC\x00\x00\x01'
+RECORD_HEADER = struct.Struct('<8sIIdd')
+# Records are buffered and appended in batches of this many, or at least once per RECORD_FLUSH_S
+RECORD_BATCH = 256
+RECORD_FLUSH_S = 1.0
+
+RecordingHeader = namedtuple('RecordingHeader', ('count', 'ids', 'rate', 'start', 'data_offset', 'record'))
+
+
+def read_recording_header(path):
+    with open(path, 'rb') as f:
+        fixed = f.read(RECORD_HEADER.size)
+        if len(fixed) < RECORD_HEADER.size:
+            raise ValueError(f'{path}: not a meter recording')
+        magic, count, ids_len, rate, start = RECORD_HEADER.unpack(fixed)
+        if magic != RECORD_MAGIC:
+            raise ValueError(f'{path}: not a meter recording (magic={magic!r})')
+        ids = json.loads(f.read(ids_len).rstrip(b'\0').decode('utf-8') or '[]')
+    return RecordingHeader(count, ids, rate, start, RECORD_HEADER.size + ids_len, struct.Struct(f'<d{count}f'))
+
+
+class RecordingMeterSource(MeterSource):
+    """Passes reads of `inner` through while appending them, timestamped, to a recording file.
+
+    A device count change (set_endpoints) continues in a new file, PATH.1, PATH.2, ...
+    """
+
+    def __init__(self, inner, path, rate, endpoint_ids=(), clock=time.monotonic):
+        self.inner = inner
+        self.count = inner.count
+        self.path = path
+        self.rate = float(rate)
+        self.ids = list(endpoint_ids)
+        self.clock = clock
+        self.segments = 0
+        self.records = 0
+        self._file = None
+
+    def _begin(self, path):
+        ids = json.dumps(self.ids).encode('utf-8')
+        ids += b'\0' * (-len(ids) % 8)
+        self._file = open(path, 'wb')
+        self._file.write(RECORD_HEADER.pack(RECORD_MAGIC, self.count, len(ids), self.rate, time.time()) + ids)
+        self._record = struct.Struct(f'<d{self.count}f')
+        self._batch = bytearray(self._record.size * RECORD_BATCH)
+        self._pending = 0
+        self._t0 = self._last_flush = self.clock()
+
+    @property
+    def channels(self):
+        return self.inner.channels
+
+    def open(self):
+        self.inner.open()
+        # Per-channel sources only know their value count once open
+        self.count = self.inner.count
+        self._begin(self.path)
+
+    def read(self):
+        levels = self.inner.read()
+        now = self.clock()
+        rec = self._record
+        rec.pack_into(self._batch, self._pending * rec.size, now - self._t0, *levels)
+        self._pending += 1
+        self.records += 1
+        if self._pending == RECORD_BATCH or now - self._last_flush >= RECORD_FLUSH_S:
+            self._flush(now)
+        return levels
+
+    def _flush(self, now):
+        if self._pending:
+            self._file.write(memoryview(self._batch)[:self._pending * self._record.size])
+            self._file.flush()
+            self._pending = 0
+        self._last_flush = now
+
+    def set_endpoints(self, endpoint_ids):
+        self.inner.set_endpoints(endpoint_ids)
+        self.ids = list(endpoint_ids)
+        if self.inner.count != self.count and self._file is not None:
+            self._end()
+            self.count = self.inner.count
+            self.segments += 1
+            self._begin(f'{self.path}.{self.segments}')
+
+    def _end(self):
+        try:
+            self._flush(self.clock())
+        finally:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        try:
+            if self._file is not None:
+                self._end()
+        finally:
+            self.inner.close()
+
+
+class ReplayMeterSource(MeterSource):
+    """Plays back a recording through a memory map.
+
+    Paced (default): each read() returns the per-device max of the records whose
+    timestamps passed since the previous read, so frames see the recorded peaks at 1x.
+    fast: one record per read(), as fast as the caller polls. At the end the replay
+    loops, or raises EOFError when `loop` is off, which ends the worker.
+    """
+
+    def __init__(self, path, fast=False, loop=True, clock=time.monotonic):
+        self.path = path
+        self.fast = fast
+        self.loop = loop
+        self.clock = clock
+        self.header = read_recording_header(path)
+        self.count = self.header.count
+        self.ids = self.header.ids
+        self._file = None
+        self._map = None
+
+    def open(self):
+        import mmap
+        self._file = open(self.path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        rec = self.header.record
+        self.records = max(0, (size - self.header.data_offset) // rec.size)
+        if self.records == 0:
+            self._file.close()
+            raise ValueError(f'{self.path}: recording has no samples')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._unpack = rec.unpack_from
+        self._offset = self.header.data_offset
+        self._size = rec.size
+        self._restart()
+
+    def _restart(self):
+        self._index = 0
+        self._levels = [0.0] * self.count
+        self._t0 = self.clock() - self._unpack(self._map, self._offset)[0]
+
+    def _at_end(self):
+        if not self.loop:
+            raise EOFError(f'{self.path}: end of recording')
+        self._restart()
+
+    def read(self):
+        if self._index >= self.records:
+            self._at_end()
+        unpack, offset, size = self._unpack, self._offset, self._size
+        if self.fast:
+            rec = unpack(self._map, offset + self._index * size)
+            self._index += 1
+            self._levels = list(rec[1:])
+            return self._levels
+        elapsed = self.clock() - self._t0
+        peaks = None
+        while self._index < self.records:
+            rec = unpack(self._map, offset + self._index * size)
+            if rec[0] > elapsed:
+                break
+            self._index += 1
+            peaks = list(rec[1:]) if peaks is None else [max(p, v) for p, v in zip(peaks, rec[1:])]
+        if peaks is not None:
+            self._levels = peaks
+        # Between records (recorded faster than the frame rate is the common case) hold the last levels
+        return self._levels
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def make_meter_source(spec, endpoint_ids, per_channel=False):
+    """Build a MeterSource from a --source spec.
+
+    pycaw                          live endpoints (default)
+    fake:CH[,CH...][:PATTERN]      fake endpoints with CH channels each, through the pycaw path
+    synthetic[:PATTERN[:COUNT]]    generated sine/bursts/noise levels
+    wav:PATH                       block peaks of a WAV file, looped
+    fifo:PATH[:CHANNELS]           raw s16le PCM from a FIFO/pipe ('-' = stdin)
+    replay:PATH[:fast][:once]      a --record file, at 1x or one record per frame
+    """
+    kind, _, rest = (spec or 'pycaw').partition(':')
+    if kind == 'pycaw':
+        return PycawMeterSource(endpoint_ids, per_channel)
+    if kind == 'fake':
+        counts, _, pattern = rest.partition(':')
+        channels = [int(c) for c in counts.split(',') if c.strip()] if counts else [2]
+        return FakeEndpointMeterSource(channels, pattern or 'sine', per_channel)
+    if kind == 'synthetic':
+        parts = rest.split(':') if rest else []
+        pattern = parts[0] if parts else 'sine'
+        count = int(parts[1]) if len(parts) > 1 else max(1, len(endpoint_ids))
+        return SyntheticMeterSource(count, pattern)
+    if kind == 'wav':
+        return WavFileMeterSource(rest)
+    if kind == 'fifo':
+        path, channels = rest, 1
+        head, sep, tail = rest.rpartition(':')
+        if sep and tail.isdigit():
+            path, channels = head, int(tail)
+        return FifoMeterSource(path, channels)
+    if kind == 'replay':
+        path, flags = rest, set()
+        head, sep, tail = path.rpartition(':')
+        while sep and tail in ('fast', 'once'):
+            flags.add(tail)
+            path = head
+            head, sep, tail = path.rpartition(':')
+        return ReplayMeterSource(path, fast='fast' in flags, loop='once' not in flags)
+    raise ValueError(f'unknown meter source: {spec}')
+
+
+# --- High-rate sampling and ballistics ---
+
+class LevelRing:
+    """Fixed-size per-device sample history in array('f') rings; one writer, one reader."""
+
+    def __init__(self, count, capacity):
+        self.capacity = max(1, int(capacity))
+        self.rings = [array('f', bytes(4 * self.capacity)) for _ in range(count)]
+        # Total samples written; a slot is filled before this is bumped
+        self.written = 0
+
+    def write(self, levels):
+        i = self.written % self.capacity
+        for ring, lvl in zip(self.rings, levels):
+            ring[i] = lvl
+        self.written += 1
+
+    def max_since(self, pos):
+        """Per-device max of the samples written after `pos` (None if there are none) and the new position."""
+        end = self.written
+        start = max(pos, end - self.capacity)
+        if start >= end:
+            return None, end
+        a = start % self.capacity
+        b = end % self.capacity
+        out = []
+        for ring in self.rings:
+            if a < b:
+                out.append(max(ring[a:b]))
+            elif b:
+                out.append(max(max(ring[a:]), max(ring[:b])))
+            else:
+                out.append(max(ring[a:]))
+        return out, end
+
+
+class SampledMeterSource(MeterSource):
+    """Polls an inner source on its own thread at `rate` Hz into a LevelRing.
+
+    read() returns the max-hold of every sample taken since the previous read, so
+    transients between frames are not lost and the render rate stays independent.
+    """
+
+    def __init__(self, inner, rate=200.0, history=1.0):
+        self.inner = inner
+        self.count = inner.count
+        self.rate = float(rate)
+        self.history = history
+        self.ring = LevelRing(self.count, int(self.rate * history) + 1)
+        self._ring_seen = self.ring
+        self._pos = 0
+        self._last = [0.0] * self.count
+        self._pending_ids = None
+        self._applied = threading.Event()
+        self._opened = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def channels(self):
+        return self.inner.channels
+
+    def open(self):
+        self._stop.clear()
+        self._opened.clear()
+        self._pos = self.ring.written
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        # The worker plans its bars from count/channels right after open()
+        self._opened.wait(1.0)
+
+    def set_endpoints(self, endpoint_ids):
+        if self._thread is None:
+            self._pending_ids = list(endpoint_ids)
+            self._apply_endpoints()
+            return
+        # The inner source lives on the sampler thread; hand the change over and wait one sample
+        self._applied.clear()
+        self._pending_ids = list(endpoint_ids)
+        self._applied.wait(1.0)
+
+    def _apply_endpoints(self):
+        ids, self._pending_ids = self._pending_ids, None
+        try:
+            self.inner.set_endpoints(ids)
+            if self.inner.count != self.count:
+                self.count = self.inner.count
+                self.ring = LevelRing(self.count, self.ring.capacity)
+        finally:
+            self._applied.set()
+
+    def _run(self):
+        # Windows timers tick every ~15.6 ms unless the resolution is raised
+        timer_1ms = sys.platform == 'win32' and self.rate > 64
+        if timer_1ms:
+            ctypes.windll.winmm.timeBeginPeriod(1)
+        try:
+            try:
+                self.inner.open()
+                if self.inner.count != self.count:
+                    self.count = self.inner.count
+                    self.ring = LevelRing(self.count, self.ring.capacity)
+            finally:
+                self._opened.set()
+            pacing = FrameScheduler(self.rate, 0, 0)
+            while not self._stop.is_set():
+                if self._pending_ids is not None:
+                    self._apply_endpoints()
+                self.ring.write(self.inner.read())
+                if self._stop.wait(pacing.tick(False)):
+                    break
+        finally:
+            self.inner.close()
+            if timer_1ms:
+                ctypes.windll.winmm.timeEndPeriod(1)
+
+    def read(self):
+        ring = self.ring
+        if ring is not self._ring_seen:
+            # Device count changed on the sampler thread: start over on the new ring
+            self._ring_seen = ring
+            self._pos = 0
+            self._last = [0.0] * len(ring.rings)
+        levels, self._pos = ring.max_since(self._pos)
+        if levels is not None:
+            self._last = levels
+        return self._last
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+
+
+# (attack, release, peak hold) in seconds; attack/release are exponential time constants
+BALLISTICS_PRESETS = {
+    'none': (0.0, 0.0, 0.0),
+    # VU: 99% of a step in 300 ms both ways, i.e. a time constant of 0.3 s / ln(100) ~ 65 ms
+    'vu': (0.3 / math.log(100), 0.3 / math.log(100), 0.0),
+    # DIN-style PPM: ~5 ms integration, 20 dB fall in about 1.5 s
+    'ppm': (0.005, 0.65, 0.0),
+}
+
+
+class Ballistics:
+    """Attack/release smoothing with optional peak hold, applied per frame to display levels."""
+
+    def __init__(self, count, attack=0.0, release=0.0, hold=0.0, clock=time.monotonic):
+        self.attack = max(0.0, attack)
+        self.release = max(0.0, release)
+        self.hold = max(0.0, hold)
+        self.clock = clock
+        self.values = [0.0] * count
+        self._hold_until = [0.0] * count
+        self._last = None
+
+    def resize(self, count):
+        if count != len(self.values):
+            self.values = [0.0] * count
+            self._hold_until = [0.0] * count
+
+    def process(self, levels):
+        now = self.clock()
+        dt = 0.0 if self._last is None else now - self._last
+        self._last = now
+        # Fraction of the remaining distance covered this frame; instant when the constant is 0
+        up = 1.0 - math.exp(-dt / self.attack) if self.attack > 0 else 1.0
+        down = 1.0 - math.exp(-dt / self.release) if self.release > 0 else 1.0
+        values = self.values
+        hold_until = self._hold_until
+        for i, x in enumerate(levels):
+            v = values[i]
+            if x >= v:
+                v += (x - v) * up
+                hold_until[i] = now + self.hold
+            elif now >= hold_until[i]:
+                v += (x - v) * down
+            values[i] = v
+        return values
+
+
+def make_ballistics(count, preset='none', attack_ms=None, release_ms=None, hold_ms=None):
+    """Ballistics for a preset with optional millisecond overrides; None when it would be a no-op."""
+    attack, release, hold = BALLISTICS_PRESETS[preset]
+    if attack_ms is not None:
+        attack = attack_ms / 1000.0
+    if release_ms is not None:
+        release = release_ms / 1000.0
+    if hold_ms is not None:
+        hold = hold_ms / 1000.0
+    if attack <= 0 and release <= 0 and hold <= 0:
+        return None
+    return Ballistics(count, attack, release, hold)
+
+
+# Frames pushed to the tray icon vs. frames skipped because nothing visible changed
+frame_stats = {'rendered': 0, 'skipped': 0}
+
+
+class LatencyHistogram:
+    """Durations counted in quarter-octave buckets (1 us .. ~16 s) plus total and max.
+
+    add() is a bisect and three updates, cheap enough for every frame; percentiles are
+    bucket midpoints (capped at the max seen), within about 10% of the true value.
+    """
+
+    BOUNDS = tuple(2.0 ** (i / 4.0) / 1e6 for i in range(96))
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                if i == 0 or i >= len(self.BOUNDS):
+                    return self.max if i else min(self.BOUNDS[0], self.max)
+                return min(math.sqrt(self.BOUNDS[i - 1] * self.BOUNDS[i]), self.max)
+        return self.max
+
+    def snapshot(self):
+        ms = 1000.0
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * ms if self.count else 0.0,
+            'p50_ms': self.percentile(50) * ms,
+            'p90_ms': self.percentile(90) * ms,
+            'p99_ms': self.percentile(99) * ms,
+            'max_ms': self.max * ms,
+        }
+
+
+class FrameMetrics:
+    """Where frame time goes: meter reads (total and per endpoint), rendering, the shell
+    round-trip of handing the image to the tray icon, and the actual interval between frames."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.read = LatencyHistogram()
+        self.render = LatencyHistogram()
+        self.update_icon = LatencyHistogram()
+        self.interval = LatencyHistogram()
+        self.devices = {}
+        self.read_errors = 0
+        self.reactivations = 0
+
+    def device(self, eid):
+        hist = self.devices.get(eid)
+        if hist is None:
+            hist = self.devices[eid] = LatencyHistogram()
+        return hist
+
+    def snapshot(self):
+        return {
+            'uptime_s': time.time() - self.started,
+            'read': self.read.snapshot(),
+            'render': self.render.snapshot(),
+            'update_icon': self.update_icon.snapshot(),
+            'frame_interval': self.interval.snapshot(),
+            'device_read': {eid: h.snapshot() for eid, h in list(self.devices.items())},
+            'read_errors': self.read_errors,
+            'reactivations': self.reactivations,
+        }
+
+
+frame_metrics = FrameMetrics()
+
+
+class NullIcon:
+    """Icon sink that discards frames (benchmarks and other runs without a tray)."""
+
+    icon = None
+
+
+class FramePipeline:
+    """One sample -> render -> publish step, shared by the worker loop and the benchmark."""
+
+    def __init__(self, source, plan, renderer, icon, ballistics=None, listeners=None):
+        self.source = source
+        self.icon = icon
+        self.ballistics = ballistics
+        # Callables fn(timestamp, levels) that see every frame's display levels, before deduplication
+        self.listeners = listeners if listeners is not None else []
+        # Once set, frames are no longer published (the owning worker is stopping)
+        self.stop_token = None
+        # True while every bar of the latest frame is at zero height
+        self.silent = True
+        self._last_start = None
+        self.set_plan(plan, renderer)
+
+    def set_plan(self, plan, renderer):
+        self.plan = plan
+        self.renderer = renderer
+        self.last_key = None
+        self._silent_key = bytes(2 * len(plan.devices))
+
+    def step(self):
+        """Run one frame; returns True if a new image was pushed to the icon."""
+        perf = time.perf_counter
+        metrics = frame_metrics
+        t0 = perf()
+        if self._last_start is not None:
+            metrics.interval.add(t0 - self._last_start)
+        self._last_start = t0
+        raw = self.source.read()
+        metrics.read.add(perf() - t0)
+        # Apply per-device gain then clamp
+        levels = [max(0.0, min(1.0, lvl * spec.gain)) for lvl, spec in zip(raw, self.plan.devices)]
+        if self.ballistics is not None:
+            levels = self.ballistics.process(levels)
+        if self.listeners:
+            now = time.time()
+            for fn in self.listeners:
+                fn(now, levels)
+        # Skip rendering and the shell round-trip when every bar lands on the same pixels.
+        # The key also drives the idle back-off, so it is needed even with nothing to render.
+        key = frame_key(self.plan, levels)
+        self.silent = key == self._silent_key[:len(key)]
+        if self.renderer is None:
+            return False
+        if isinstance(self.renderer, HistoryRenderer):
+            # The history scrolls on its own clock: a new image is due with each new column
+            key = self.renderer.advance(levels)
+        if key == self.last_key:
+            frame_stats['skipped'] += 1
+            return False
+        if self.stop_token is not None and self.stop_token.is_set():
+            return False
+        t1 = perf()
+        image = self.renderer.render(levels)
+        t2 = perf()
+        metrics.render.add(t2 - t1)
+        # pystray's icon setter does the shell round-trip itself (ICO encoding, LoadImage, NIM_MODIFY)
+        self.icon.icon = image
+        metrics.update_icon.add(perf() - t2)
+        self.last_key = key
+        frame_stats['rendered'] += 1
+        return True
+
+
+class FrameScheduler:
+    """Deadline-based frame pacing with idle back-off.
+
+    Frames are due on a fixed grid of 1/rate seconds, so render cost does not
+    accumulate as drift. After `idle_after` seconds of silent frames the period
+    stretches to 1/idle_rate; the first non-silent frame restores the full rate.
+    `clock` is injectable so the pacing can be tested without sleeping.
+    """
+
+    def __init__(self, rate=20.0, idle_rate=2.0, idle_after=5.0, clock=time.monotonic):
+        self.clock = clock
+        self.period = 1.0 / max(0.1, float(rate))
+        self.idle_period = 1.0 / float(idle_rate) if idle_rate and idle_rate > 0 else self.period
+        self.idle_after = idle_after if idle_after and idle_after > 0 else None
+        # Frames whose deadline had already passed; the grid skips ahead instead of bursting
+        self.late = 0
+        self.idle = False
+        self.start()
+
+    def start(self):
+        self._deadline = self.clock()
+        self._silent_since = None
+        self.idle = False
+
+    def tick(self, silent):
+        """Record whether the frame just produced was silent; returns seconds to wait for the next one."""
+        now = self.clock()
+        if not silent:
+            self._silent_since = None
+        elif self._silent_since is None:
+            self._silent_since = now
+        self.idle = (self.idle_after is not None and self._silent_since is not None
+                     and now - self._silent_since >= self.idle_after)
+        period = self.idle_period if self.idle else self.period
+        self._deadline += period
+        if self._deadline <= now:
+            missed = int((now - self._deadline) // period) + 1
+            self._deadline += missed * period
+            self.late += 1
+        elif self._deadline - now > period:
+            # Leaving idle: the pending slow deadline is further out than one fast period
+            self._deadline = now + period
+        return self._deadline - now
+
+
+# Worker lifecycle timings: generation of the current worker, last stop (join) and restart latency
+lifecycle_stats = {'generation': 0, 'last_stop_s': None, 'last_restart_s': None, 'stop_timeouts': 0}
+_generations = itertools.count(1)
+
+
+class WorkerProfile:
+    """cProfile window over the worker thread, enabled and disabled on that thread.
+
+    finish() writes worker-YYYYmmdd-HHMMSS.prof (for pstats/snakeviz) and a .txt summary
+    to `directory` and passes both paths to `callback`.
+    """
+
+    def __init__(self, seconds, directory=CONFIG_DIR, callback=None):
+        self.seconds = max(0.1, float(seconds))
+        self.directory = directory
+        self.callback = callback
+        self.profiler = None
+        self.deadline = None
+
+    def start(self):
+        import cProfile
+        self.profiler = cProfile.Profile()
+        self.started = time.monotonic()
+        self.deadline = self.started + self.seconds
+        self.frames0 = (frame_metrics.read.count, frame_stats['rendered'])
+        self.profiler.enable()
+
+    def due(self):
+        return time.monotonic() >= self.deadline
+
+    def finish(self):
+        import io
+        import pstats
+        self.profiler.disable()
+        elapsed = time.monotonic() - self.started
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, time.strftime('worker-%Y%m%d-%H%M%S'))
+        prof_path, text_path = base + '.prof', base + '.txt'
+        self.profiler.dump_stats(prof_path)
+        out = io.StringIO()
+        frames = frame_metrics.read.count - self.frames0[0]
+        rendered = frame_stats['rendered'] - self.frames0[1]
+        out.write(f"Worker thread profile: {elapsed:.1f} s, {frames} frames, {rendered} rendered to the icon\n"
+                  "Time in threading wait / lock acquire is the scheduler sleeping between frames.\n\n")
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.sort_stats('tottime').print_stats(25)
+        stats.sort_stats('cumulative').print_stats(25)
+        with open(text_path, 'w', encoding='utf-8') as f:
+            f.write(out.getvalue())
+        if self.callback is not None:
+            try:
+                self.callback(prof_path, text_path)
+            except Exception:
+                pass
+        return prof_path, text_path
+
+
+class MeterWorker(threading.Thread):
+    """Worker thread that samples the meter source, renders and publishes frames to the icon.
+
+    Each worker has its own stop token and generation number, so a worker being
+    stopped can never keep publishing next to its replacement. reconfigure() hands
+    new settings to the running thread, which applies them at the start of its next
+    frame without reopening meters that are still selected.
+    """
+
+    def __init__(self, icon, source, plan, renderer_mode='framebuffer', scheduler=None, ballistics=None, listeners=None,
+                 history=0.0, settings=()):
+        self.generation = next(_generations)
+        super().__init__(name=f'MeterWorker-{self.generation}', daemon=True)
+        self.icon = icon
+        self.source = source
+        self.plan = plan
+        self.renderer_mode = renderer_mode
+        self.scheduler = scheduler or FrameScheduler()
+        self.ballistics = ballistics
+        self.listeners = listeners
+        # Seconds of level history to show instead of bars (0 = bars)
+        self.history = history
+        # Display settings `plan` was compiled from; per-channel sources only know their bars once open
+        self.settings = list(settings)
+        self.stop_token = threading.Event()
+        self._pending = None
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._profile_request = None
+        self._profile = None
+
+    def stop(self, timeout=1.0):
+        """Signal this worker to stop and join it for up to `timeout` seconds; True if it exited."""
+        t0 = time.perf_counter()
+        self.stop_token.set()
+        self._wake.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        lifecycle_stats['last_stop_s'] = time.perf_counter() - t0
+        if self.is_alive():
+            lifecycle_stats['stop_timeouts'] += 1
+            return False
+        return True
+
+    def reconfigure(self, endpoint_ids, settings):
+        """Swap in a new device list and display settings; takes effect on the next frame."""
+        with self._pending_lock:
+            self._pending = (list(endpoint_ids), list(settings))
+        self._wake.set()
+
+    def profile(self, seconds, callback=None, directory=CONFIG_DIR):
+        """Profile this thread for `seconds` from its next frame; callback(prof_path, text_path) when written."""
+        with self._pending_lock:
+            self._profile_request = WorkerProfile(seconds, directory, callback)
+        self._wake.set()
+
+    def _update_profile(self):
+        if self._profile is not None and self._profile.due():
+            profile, self._profile = self._profile, None
+            profile.finish()
+        if self._profile is None and self._profile_request is not None:
+            with self._pending_lock:
+                self._profile, self._profile_request = self._profile_request, None
+            self._profile.start()
+
+    def _apply_pending(self, pipeline):
+        with self._pending_lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        endpoint_ids, self.settings = pending
+        self.source.set_endpoints(endpoint_ids)
+        self._replan(pipeline)
+        # Leave idle back-off right away so the change is visible
+        self.scheduler.start()
+
+    def _replan(self, pipeline):
+        plan = compile_render_plan(self.settings, self.source.count, self.plan.size, self.source.channels)
+        if self.ballistics is not None:
+            self.ballistics.resize(self.source.count)
+        pipeline.set_plan(plan, self._make_renderer(plan, pipeline.renderer))
+        self.plan = plan
+
+    def _make_renderer(self, plan, previous=None):
+        # Without an icon there is nothing to draw; listeners still get the levels
+        if self.icon is None:
+            return None
+        if self.history > 0:
+            try:
+                # Keep the history across settings changes while the device count and size stay the same
+                rings = previous.history() if isinstance(previous, HistoryRenderer) else None
+                return HistoryRenderer(plan, self.history, rings)
+            except ValueError:
+                pass
+        return make_renderer(plan, self.renderer_mode)
+
+    def run(self):
+        try:
+            self.source.open()
+            pipeline = FramePipeline(self.source, self.plan, self._make_renderer(self.plan),
+                                     self.icon, self.ballistics, self.listeners)
+            pipeline.stop_token = self.stop_token
+            if self.source.channels is not None:
+                # One bar per channel, as reported by the meters just activated
+                self._replan(pipeline)
+            startup_profile.mark('meter activation')
+            self.scheduler.start()
+            first_frame = True
+            while not self.stop_token.is_set():
+                self._apply_pending(pipeline)
+                self._update_profile()
+                # Without an icon nothing is pushed; the first computed frame counts
+                if (pipeline.step() or pipeline.renderer is None) and first_frame:
+                    startup_profile.mark('first frame')
+                    first_frame = False
+                # Sleeps until the next deadline; reconfigure() and stop requests wake it early
+                self._wake.wait(self.scheduler.tick(pipeline.silent))
+                self._wake.clear()
+        except EOFError:
+            pass  # a finite source (replay ...:once) ran out
+        finally:
+            if self._profile is not None:
+                # Stopped mid-window: keep what was captured
+                try:
+                    self._profile.finish()
+                except Exception:
+                    pass
+                self._profile = None
+            self.source.close()
+
+
+# --- Benchmark ---
+
+BENCH_DEVICE_COUNTS = (1, 2, 4, 8, 16, 32)
+BENCH_ICON_SIZES = ICON_SIZES
+BENCH_NOMINAL_HZ = 20
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+def bench_case(count, size, renderer_mode='framebuffer', frames=400, pattern='noise', replay=None):
+    """Time `frames` unthrottled pipeline steps against a synthetic source (or a recording) and a NullIcon."""
+    if replay:
+        source = ReplayMeterSource(replay, fast=True)
+        source.open()
+        count = source.count
+    else:
+        source = SyntheticMeterSource(count, pattern)
+    plan = compile_render_plan([], count, size)
+    renderer = make_renderer(plan, renderer_mode)
+    pipeline = FramePipeline(source, plan, renderer, NullIcon())
+    for _ in range(20):
+        pipeline.step()
+    times = []
+    perf, cpu = time.perf_counter, time.thread_time
+    cpu0 = cpu()
+    t0 = perf()
+    for _ in range(frames):
+        s = perf()
+        pipeline.step()
+        times.append(perf() - s)
+    wall = perf() - t0
+    cpu_per_frame = (cpu() - cpu0) / frames
+    # Separate pass under tracemalloc: transient bytes allocated within a frame and net growth
+    import tracemalloc
+    tracemalloc.start()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    peaks = 0
+    for _ in range(frames):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        pipeline.step()
+        peaks += tracemalloc.get_traced_memory()[1] - before
+    retained = tracemalloc.get_traced_memory()[0] - start_bytes
+    tracemalloc.stop()
+    # Renderer alone on the same kind of levels, without frame dedup or the rest of the pipeline
+    samples = [source.read() for _ in range(min(frames, 200))]
+    render_times = []
+    for levels in samples * max(1, frames // len(samples)):
+        s = perf()
+        renderer.render(levels)
+        render_times.append(perf() - s)
+    render_times.sort()
+    source.close()
+    times.sort()
+    return {
+        'devices': count,
+        'size': size,
+        'renderer': renderer_mode,
+        'fps': frames / wall if wall > 0 else 0.0,
+        'frame_ms_p50': _percentile(times, 50) * 1000.0,
+        'frame_ms_p99': _percentile(times, 99) * 1000.0,
+        'render_ms_p50': _percentile(render_times, 50) * 1000.0,
+        'alloc_peak_bytes_per_frame': peaks / frames,
+        'retained_bytes_per_frame': retained / frames,
+        'cpu_s_per_s_at_20hz': cpu_per_frame * BENCH_NOMINAL_HZ,
+    }
+
+
+def _numpy_available():
+    try:
+        import numpy  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def bench_crossover(results, slow='framebuffer', fast='numpy'):
+    """Per icon size, the smallest device count from which `fast` renders faster than `slow` at every larger count."""
+    out = {}
+    for size in sorted({r['size'] for r in results}):
+        a = {r['devices']: r['render_ms_p50'] for r in results if r['renderer'] == slow and r['size'] == size}
+        b = {r['devices']: r['render_ms_p50'] for r in results if r['renderer'] == fast and r['size'] == size}
+        crossover = None
+        for count in sorted(set(a) & set(b), reverse=True):
+            if b[count] >= a[count]:
+                break
+            crossover = count
+        out[str(size)] = crossover
+    return out
+
+
+def run_bench(device_counts=BENCH_DEVICE_COUNTS, sizes=BENCH_ICON_SIZES, renderers=None,
+              frames=400, pattern='noise', replay=None):
+    import platform
+    import PIL
+    if renderers is None:
+        renderers = ('framebuffer', 'draw') + (('numpy',) if _numpy_available() else ())
+    if replay:
+        # A recording fixes the device count and supplies the levels
+        device_counts = (read_recording_header(replay).count,)
+    results = []
+    for mode in renderers:
+        for size in sizes:
+            for count in device_counts:
+                results.append(bench_case(count, size, mode, frames, pattern, replay))
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pillow': PIL.__version__,
+        'frames': frames,
+        'pattern': None if replay else pattern,
+        'replay': replay,
+        'results': results,
+        'numpy_crossover_devices': bench_crossover(results) if 'numpy' in renderers else None,
+    }
+
+
+# --- Engine ---
+
+# Levels of one frame as seen by VUEngine.frames(): wall-clock timestamp and display levels per bar
+Frame = namedtuple('Frame', ('seq', 'timestamp', 'levels'))
+
+WORKER_STOP_TIMEOUT = 1.0
+
+
+class VUEngine:
+    """The meter without a tray: device selection, settings, source, scheduler and renderer.
+
+    start() launches a MeterWorker; stop() joins it; reconfigure() hot-applies new
+    devices/settings; frames() iterates over the latest levels. With an `icon`
+    (anything with an `icon` attribute, e.g. a pystray.Icon) frames are rendered and
+    published to it, otherwise only levels are computed and Pillow is never loaded.
+    """
+
+    def __init__(self, endpoint_ids=(), settings=(), source='pycaw', renderer='auto', rate=20.0,
+                 idle_rate=2.0, idle_after=5.0, sample_rate=0.0, ballistics='none', attack_ms=None,
+                 release_ms=None, hold_ms=None, icon=None, size=ICON_SIZE, record=None, history=0.0,
+                 per_channel=False):
+        self.endpoint_ids = list(endpoint_ids)
+        self.settings = list(settings)
+        self.source_spec = source
+        self.renderer_mode = renderer
+        self.rate = rate
+        self.idle_rate = idle_rate
+        self.idle_after = idle_after
+        self.sample_rate = sample_rate
+        self.ballistics_preset = (ballistics, attack_ms, release_ms, hold_ms)
+        self.icon = icon
+        self.size = size
+        self.record = record
+        self.history = history
+        self.per_channel = per_channel
+        self.listeners = []
+        self._worker = None
+        self._frame = None
+        self._frame_cond = threading.Condition()
+        self._frame_waiters = 0
+        self._profile_request = None
+        # (source channel list, bar ids) of the last bar_ids() call in per-channel mode
+        self._bar_ids = None
+
+    @property
+    def running(self):
+        return self._worker is not None and self._worker.is_alive()
+
+    @property
+    def period(self):
+        return 1.0 / max(0.1, float(self.rate))
+
+    def start(self):
+        """Start a new worker, stopping any previous one first."""
+        if self._worker is not None:
+            self._worker.stop(WORKER_STOP_TIMEOUT)
+        source = make_meter_source(self.source_spec, self.endpoint_ids, self.per_channel)
+        if self.record:
+            # Record raw reads (at the sample rate when sampling) so a replay goes through gain/curve again
+            source = RecordingMeterSource(source, self.record, self.sample_rate if self.sample_rate > 0 else self.rate,
+                                          self.endpoint_ids)
+        if self.sample_rate > 0:
+            source = SampledMeterSource(source, self.sample_rate)
+        ballistics = make_ballistics(source.count, *self.ballistics_preset)
+        # Parse gains, curves, colors and bar layout once per worker, not per frame
+        plan = compile_render_plan(self.settings, source.count, self.size)
+        scheduler = FrameScheduler(self.rate, self.idle_rate, self.idle_after)
+        self._worker = MeterWorker(self.icon, source, plan, self.renderer_mode, scheduler, ballistics, self.listeners,
+                                   self.history, self.settings)
+        lifecycle_stats['generation'] = self._worker.generation
+        if self._profile_request is not None:
+            self._worker.profile(*self._profile_request)
+            self._profile_request = None
+        self._worker.start()
+
+    def stop(self, timeout=WORKER_STOP_TIMEOUT):
+        """Stop the worker, waiting up to `timeout` seconds; True if it has exited."""
+        worker, self._worker = self._worker, None
+        stopped = worker.stop(timeout) if worker is not None else True
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+        return stopped
+
+    def restart(self, endpoint_ids=None, settings=None):
+        """Tear down and start again (reopens every meter); prefer reconfigure()."""
+        if endpoint_ids is not None:
+            self.endpoint_ids = list(endpoint_ids)
+        if settings is not None:
+            self.settings = list(settings)
+        t0 = time.perf_counter()
+        self.start()
+        lifecycle_stats['last_restart_s'] = time.perf_counter() - t0
+
+    def reconfigure(self, endpoint_ids, settings):
+        """Hot-apply a new device list and settings; restarts only if the worker is not running."""
+        self.endpoint_ids = list(endpoint_ids)
+        self.settings = list(settings)
+        if self.running:
+            self._worker.reconfigure(self.endpoint_ids, self.settings)
+        else:
+            self.restart()
+
+    def profile(self, seconds, callback=None, directory=CONFIG_DIR):
+        """cProfile the worker thread for `seconds` (from start() if not running yet).
+
+        The .prof file and text summary go to `directory`; callback(prof_path, text_path)
+        runs on the worker thread once they are written.
+        """
+        if self.running:
+            self._worker.profile(seconds, callback, directory)
+        else:
+            self._profile_request = (seconds, callback, directory)
+
+    def diagnostics(self):
+        """Snapshot of frame counters, timing histograms, worker lifecycle and meter health."""
+        worker = self._worker
+        d = {
+            'time': time.time(),
+            'rate': self.rate,
+            'frames': dict(frame_stats),
+            'lifecycle': dict(lifecycle_stats),
+        }
+        d.update(frame_metrics.snapshot())
+        if worker is not None:
+            d['frames']['late'] = worker.scheduler.late
+            d['idle'] = worker.scheduler.idle
+            source = worker.source
+            # Health lives on the innermost (pycaw) source under sampling/recording wrappers
+            while not hasattr(source, 'health') and hasattr(source, 'inner'):
+                source = source.inner
+            if hasattr(source, 'health'):
+                d['health'] = dict(zip(source.endpoint_ids, source.health()))
+        d['names'] = {e.get('id'): e.get('name') for e in self.settings if e.get('id') and e.get('name')}
+        return d
+
+    def bar_ids(self):
+        """One id per published level, in bar order: the endpoint id, or 'ID#N' for channel N
+        of each device when the source splits devices into channels.
+
+        Returns the same list object until the devices or their channel counts change, so
+        listeners can compare by identity (see SharedLevelPublisher).
+        """
+        worker = self._worker
+        channels = worker.source.channels if worker is not None else None
+        if channels is None:
+            return self.endpoint_ids
+        cached = self._bar_ids
+        if cached is not None and cached[0] is channels:
+            return cached[1]
+        # Per-channel sources report channels per device of their own endpoint list (fake sources have their own ids)
+        source = worker.source
+        while not hasattr(source, 'endpoint_ids') and hasattr(source, 'inner'):
+            source = source.inner
+        ids = getattr(source, 'endpoint_ids', None)
+        if ids is None or len(ids) != len(channels):
+            ids = self.endpoint_ids
+        bars = [f'{eid}#{ch}' for eid, n in zip(ids, channels) for ch in range(n)]
+        self._bar_ids = (channels, bars)
+        return bars
+
+    def bar_names(self):
+        """Label per published level: the device's name (or id), 'NAME#N' per channel when split."""
+        names = [d.get('name') or d.get('id') or '' for d in self.settings]
+        worker = self._worker
+        channels = worker.source.channels if worker is not None else None
+        if channels is None:
+            return names
+        ids = self.bar_ids()
+        labels = []
+        for i, n in enumerate(channels):
+            base = names[i] if i < len(names) else ''
+            for ch in range(n):
+                labels.append(f'{base}#{ch}' if base else ids[len(labels)])
+        return labels
+
+    def add_listener(self, fn):
+        """Call fn(timestamp, levels) on the worker thread for every frame; levels must not be kept."""
+        self.listeners.append(fn)
+
+    def remove_listener(self, fn):
+        try:
+            self.listeners.remove(fn)
+        except ValueError:
+            pass
+
+    def _publish(self, timestamp, levels):
+        with self._frame_cond:
+            seq = self._frame.seq + 1 if self._frame is not None else 1
+            self._frame = Frame(seq, timestamp, tuple(levels))
+            self._frame_cond.notify_all()
+
+    def frames(self, timeout=None):
+        """Yield the latest Frame as the worker produces them; slow consumers skip frames.
+
+        Ends when the engine stops, or when no frame arrives within `timeout` seconds.
+        """
+        with self._frame_cond:
+            self._frame_waiters += 1
+            if self._frame_waiters == 1:
+                self.add_listener(self._publish)
+        try:
+            seq = self._frame.seq if self._frame is not None else 0
+            while True:
+                with self._frame_cond:
+                    fresh = self._frame_cond.wait_for(
+                        lambda: (self._frame is not None and self._frame.seq != seq) or not self.running, timeout)
+                    if not fresh or self._frame is None or self._frame.seq == seq:
+                        return
+                    frame = self._frame
+                seq = frame.seq
+                yield frame
+        finally:
+            with self._frame_cond:
+                self._frame_waiters -= 1
+                if self._frame_waiters == 0:
+                    self.remove_listener(self._publish)
+
+
+def format_diagnostics(d):
+    """Human-readable report of VUEngine.diagnostics() for the Diagnostics window."""
+    def row(label, h):
+        return (f"{label:<16} p50 {h['p50_ms']:7.2f}  p90 {h['p90_ms']:7.2f}  p99 {h['p99_ms']:7.2f}"
+                f"  max {h['max_ms']:7.2f} ms  (n={h['count']})")
+
+    frames = d.get('frames', {})
+    lines = [
+        f"Uptime {d.get('uptime_s', 0.0):.0f} s, target {d.get('rate', 0)} Hz{', idle' if d.get('idle') else ''}",
+        f"Frames: {frames.get('rendered', 0)} rendered, {frames.get('skipped', 0)} unchanged (skipped), "
+        f"{frames.get('late', 0)} late",
+        '',
+        row('Frame interval', d['frame_interval']),
+        row('Meter read', d['read']),
+        row('Render', d['render']),
+        row('Icon update', d['update_icon']),
+    ]
+    names = d.get('names', {})
+    health = d.get('health', {})
+    if d.get('device_read'):
+        lines += ['', 'Per device meter read:']
+        for eid, h in d['device_read'].items():
+            label = names.get(eid) or eid
+            state = f" [{health[eid]}]" if eid in health else ''
+            lines.append(row('  ' + label[:14], h) + state)
+    lifecycle = d.get('lifecycle', {})
+    restart = lifecycle.get('last_restart_s')
+    lines += [
+        '',
+        f"Read errors {d.get('read_errors', 0)}, reactivations {d.get('reactivations', 0)}",
+        f"Worker generation {lifecycle.get('generation')}, last restart "
+        + (f"{restart * 1000.0:.1f} ms" if restart is not None else '-')
+        + f", stop timeouts {lifecycle.get('stop_timeouts', 0)}",
+    ]
+    return '\n'.join(lines)
+
+
+STATS_PATH = os.path.join(CONFIG_DIR, 'stats.jsonl')
+
+
+class StatsLogger(threading.Thread):
+    """Appends engine.diagnostics() as one JSON line to `path` every `interval` seconds (and on close)."""
+
+    def __init__(self, engine, path=STATS_PATH, interval=60.0):
+        super().__init__(name='vu-stats', daemon=True)
+        self.engine = engine
+        self.path = path
+        self.interval = max(1.0, float(interval))
+        self._done = threading.Event()
+
+    def write(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(self.engine.diagnostics()) + '\n')
+        except Exception:
+            pass
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.write()
+
+    def close(self):
+        self._done.set()
+        self.join(1.0)
+        self.write()
+
+
+# --- Headless streaming ---
+
+# Pending output is written out once it reaches this many bytes or is this old, whichever comes first
+STREAM_BATCH_BYTES = 16384
+STREAM_BATCH_S = 0.1
+# UDP payloads are split on line boundaries to stay under a typical MTU
+UDP_MAX_DATAGRAM = 1400
+
+
+class _UdpOut:
+    """write(bytes) sink that sends whole lines over UDP in datagrams of at most UDP_MAX_DATAGRAM bytes."""
+
+    def __init__(self, host, port):
+        import socket
+        self.addr = (host, int(port))
+        self.sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write(self, data):
+        start = 0
+        while start < len(data):
+            end = start + UDP_MAX_DATAGRAM
+            if end < len(data):
+                cut = data.rfind(b'\n', start, end)
+                end = cut + 1 if cut >= start else end
+            try:
+                self.sock.sendto(data[start:end], self.addr)
+            except OSError:
+                pass  # nobody listening yet; datagrams are best effort
+            start = end
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.sock.close()
+
+
+class LevelStream:
+    """Engine listener that writes timestamped levels as CSV or NDJSON lines in batches.
+
+    `out` is a binary stream (or _UdpOut). With `on_change`, a frame is only written when
+    its formatted levels differ from the previous line. `names` label the CSV columns; a
+    callable is asked when the header is written, with the first frame.
+    """
+
+    FORMATS = ('csv', 'ndjson')
+
+    def __init__(self, out, fmt='csv', on_change=False, names=(), precision=4,
+                 batch_bytes=STREAM_BATCH_BYTES, batch_s=STREAM_BATCH_S, clock=time.monotonic):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"unknown stream format: {fmt}")
+        self.out = out
+        self.fmt = fmt
+        self.on_change = on_change
+        self.names = names if callable(names) else list(names)
+        self.level_fmt = f"%.{int(precision)}f"
+        self.batch_bytes = batch_bytes
+        self.batch_s = batch_s
+        self.clock = clock
+        self.pending = []
+        self.pending_bytes = 0
+        self.first_pending = 0.0
+        self.last = None
+        self.header_written = False
+        self.lines = 0
+        self.broken = False
+
+    def _header(self, count):
+        import csv
+        import io
+        given = self.names() if callable(self.names) else self.names
+        names = [(given[i] if i < len(given) and given[i] else f"level{i}") for i in range(count)]
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator='\n').writerow(['timestamp'] + names)
+        return buf.getvalue()
+
+    def __call__(self, timestamp, levels):
+        if self.broken:
+            return
+        fmt = self.level_fmt
+        vals = ','.join([fmt % v for v in levels])
+        if self.on_change and vals == self.last:
+            return
+        self.last = vals
+        if self.fmt == 'csv':
+            line = f"{timestamp:.6f},{vals}\n"
+            if not self.header_written:
+                line = self._header(len(levels)) + line
+                self.header_written = True
+        else:
+            line = f'{{"t":{timestamp:.6f},"levels":[{vals}]}}\n'
+        if not self.pending:
+            self.first_pending = self.clock()
+        self.pending.append(line)
+        self.pending_bytes += len(line)
+        self.lines += 1
+        if self.pending_bytes >= self.batch_bytes or self.clock() - self.first_pending >= self.batch_s:
+            self.flush()
+
+    def flush(self):
+        if not self.pending or self.broken:
+            return
+        data = ''.join(self.pending).encode('utf-8')
+        self.pending = []
+        self.pending_bytes = 0
+        try:
+            self.out.write(data)
+            self.out.flush()
+        except (BrokenPipeError, ValueError, OSError):
+            # Reader went away; stop producing instead of raising on the worker thread
+            self.broken = True
+
+
+def parse_udp_target(spec):
+    """'HOST:PORT' or ':PORT' (localhost) -> (host, port)."""
+    host, _, port = spec.rpartition(':')
+    host = host.strip('[]') or '127.0.0.1'
+    return host, int(port)
+
+
+def run_headless(engine, fmt='csv', on_change=False, udp=None, duration=None):
+    """Stream the engine's levels to stdout or a UDP socket until interrupted; returns the exit code."""
+    out = _UdpOut(*parse_udp_target(udp)) if udp else sys.stdout.buffer
+    # Bar names are only known once the meters are open (one column per channel with --channels)
+    stream = LevelStream(out, fmt, on_change, engine.bar_names)
+    engine.add_listener(stream)
+    engine.start()
+    deadline = time.monotonic() + duration if duration else None
+    try:
+        while engine.running and not stream.broken:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+        engine.remove_listener(stream)
+        stream.flush()
+        if udp:
+            out.close()
+    return 0
 
-# --- Get default render device ---
 
-def get_default_render_device_id():
-    coinit = False
+# --- Shared-memory publication ---
+#
+# One process polls the meters; any number of local readers map the block and read the
+# latest frame without locks or syscalls. Layout (little-endian, offsets in bytes):
+#
+#    0  char[8]   magic b'VUTRAYL1'
+#    8  uint32    layout version (1)
+#   12  uint32    capacity: number of level/id slots
+#   16  uint64    sequence: odd while the writer is mid-update, +2 per published frame
+#   24  uint32    count: valid levels in this frame (<= capacity)
+#   28  uint32    id slot size in bytes
+#   32  float64   wall-clock timestamp of the frame (time.time())
+#   40  ...       reserved, zero
+#   64  float32[capacity]          levels, after gain and ballistics (the display curve is not applied)
+#   64 + 4*capacity  char[capacity][id slot size]   bar ids, UTF-8, NUL padded
+#
+# The writer makes the sequence odd, writes the levels, count and timestamp, then stores
+# the next even sequence on its own. Readers copy what they need between two reads of
+# the sequence and retry if it was odd or changed (seqlock); see SharedLevelReader.
+
+SHM_NAME = 'vu_tray_levels'
+SHM_MAGIC = b'VUTRAYL1'
+SHM_VERSION = 1
+SHM_CAPACITY = 64
+SHM_ID_BYTES = 128
+SHM_HEADER = struct.Struct('<8sIIQIId')
+SHM_LEVELS_OFFSET = 64
+_SHM_SEQ = struct.Struct('<Q')
+# count, id slot size, timestamp: the frame fields after the sequence, at offset 24
+_SHM_FRAME = struct.Struct('<IId')
+
+
+def _shm_size(capacity, id_bytes=SHM_ID_BYTES):
+    return SHM_LEVELS_OFFSET + 4 * capacity + capacity * id_bytes
+
+
+# Blocks created by this process; attaching to one of them must leave its tracker registration alone
+_shm_created = set()
+
+
+def _open_shm(name, create=False, size=0):
+    from multiprocessing import shared_memory
     try:
+        # Python 3.13+: keep the resource tracker from unlinking a block this process did not create
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=create)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    if create:
+        _shm_created.add(name)
+    elif os.name != 'nt' and name not in _shm_created:
+        # Older Pythons register attached blocks too and would unlink the publisher's block on exit
         try:
-            comtypes.CoInitialize()
-            coinit = True
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
         except Exception:
             pass
+    return shm
+
+
+class SharedLevelPublisher:
+    """Engine listener that publishes every frame's levels into a named shared-memory block.
+
+    `ids` is a callable returning the current id of each bar (e.g. VUEngine.bar_ids); it is
+    re-read when the returned list object changes (VUEngine replaces it on reconfigure).
+    """
+
+    def __init__(self, name=SHM_NAME, capacity=SHM_CAPACITY, ids=None):
+        self.name = name
+        self.capacity = capacity
+        self.ids = ids
+        size = _shm_size(capacity)
         try:
-            enumerator = comtypes.CoCreateInstance(
-                CLSID_MMDeviceEnumerator,
-                IMMDeviceEnumerator,
-                CLSCTX_ALL
-            )
-            dev = enumerator.GetDefaultAudioEndpoint(0, 1)
-            did = dev.GetId()
-            try:
-                enumerator.Release()
-            except Exception:
-                pass
-            return did
-        except Exception:
-            return None
-    finally:
-        if coinit:
+            self.shm = _open_shm(name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a previous run that did not exit cleanly: take it over if it fits
+            _shm_created.add(name)
+            self.shm = _open_shm(name)
+            if self.shm.size < size:
+                self.shm.close()
+                raise
+        self.buf = self.shm.buf
+        self.buf[:SHM_LEVELS_OFFSET] = bytes(SHM_LEVELS_OFFSET)
+        SHM_HEADER.pack_into(self.buf, 0, SHM_MAGIC, SHM_VERSION, capacity, 0, 0, SHM_ID_BYTES, 0.0)
+        self.seq = 0
+        self._ids_src = None
+        self._levels_structs = {}
+
+    def _write_ids(self, ids):
+        base = SHM_LEVELS_OFFSET + 4 * self.capacity
+        for i in range(self.capacity):
+            raw = ids[i].encode('utf-8')[:SHM_ID_BYTES] if i < len(ids) and ids[i] else b''
+            off = base + i * SHM_ID_BYTES
+            self.buf[off:off + SHM_ID_BYTES] = raw.ljust(SHM_ID_BYTES, b'\0')
+
+    def __call__(self, timestamp, levels):
+        n = min(len(levels), self.capacity)
+        st = self._levels_structs.get(n)
+        if st is None:
+            st = self._levels_structs[n] = struct.Struct(f'<{n}f')
+        buf = self.buf
+        # Odd sequence marks the block as being written
+        self.seq += 1
+        _SHM_SEQ.pack_into(buf, 16, self.seq)
+        if self.ids is not None:
+            ids = self.ids()
+            if ids is not self._ids_src:
+                self._ids_src = ids
+                self._write_ids(ids)
+        st.pack_into(buf, SHM_LEVELS_OFFSET, *levels[:n])
+        _SHM_FRAME.pack_into(buf, 24, n, SHM_ID_BYTES, timestamp)
+        # The even sequence goes in last, on its own, once the whole frame is in place
+        self.seq += 1
+        _SHM_SEQ.pack_into(buf, 16, self.seq)
+
+    def close(self, unlink=True):
+        self.buf = None
+        self.shm.close()
+        if unlink:
             try:
-                comtypes.CoUninitialize()
-            except Exception:
+                self.shm.unlink()
+            except FileNotFoundError:
                 pass
 
-# Argument parsing for device selection/listing
-parser = argparse.ArgumentParser(description="System tray VU meter using pycaw")
-parser.add_argument("--list-devices", action="store_true", help="List available audio endpoint devices and exit")
-parser.add_argument("--devices", nargs="+", help="One or more device indices or name substrings. Omit to use default render device")
-parser.add_argument("--gains", nargs="+", type=float, help="Per-device gains (one per device). If fewer than devices, remaining default to 1.0")
-args = parser.parse_args()
 
+class SharedLevelReader:
+    """Reads frames published by SharedLevelPublisher from another process.
 
+    read() returns Frame(seq, timestamp, levels) for the latest consistent frame, or None
+    if nothing has been published yet. Consumers can poll it and compare seq to skip repeats.
+    """
 
-# Handle device listing
-if args.list_devices:
-    # Prefer our helper that resolves stable endpoint IDs
-    devices_simple = list_all_devices()
-    # Try also to get states via pycaw objects, aligned by index
-    try:
-        pycaw_devs = AudioUtilities.GetAllDevices()
-    except Exception:
-        pycaw_devs = []
-    if not devices_simple:
-        print("No devices found.")
-    else:
-        for idx, d in enumerate(devices_simple):
-            name = d.get('name')
-            did = d.get('id')
-            state = None
-            if idx < len(pycaw_devs):
-                try:
-                    state = getattr(pycaw_devs[idx], 'State', None)
-                except Exception:
-                    state = None
-            state_part = f" (state={state})" if state is not None else ""
-            print(f"[{idx}] {name} | id={did}{state_part}")
-    sys.exit(0)
+    def __init__(self, name=SHM_NAME, timeout=1.0):
+        self.shm = _open_shm(name)
+        self.buf = self.shm.buf
+        magic, version, capacity, _, _, id_bytes, _ = SHM_HEADER.unpack_from(self.buf, 0)
+        if magic != SHM_MAGIC or version != SHM_VERSION:
+            self.shm.close()
+            raise ValueError(f"{name}: not a VU Tray level block (magic={magic!r}, version={version})")
+        self.capacity = capacity
+        self.id_bytes = id_bytes
+        self.timeout = timeout
+        self._levels_structs = {}
 
-selected_imm_device = None
+    def read(self):
+        buf = self.buf
+        deadline = None
+        while True:
+            seq = _SHM_SEQ.unpack_from(buf, 16)[0]
+            if seq & 1:
+                # Writer is mid-update (or was preempted there): yield instead of spinning
+                if deadline is None:
+                    deadline = time.monotonic() + self.timeout
+                elif time.monotonic() > deadline:
+                    raise TimeoutError("shared level block stayed mid-update")
+                time.sleep(0)
+                continue
+            count, _, timestamp = _SHM_FRAME.unpack_from(buf, 24)
+            count = min(count, self.capacity)
+            st = self._levels_structs.get(count)
+            if st is None:
+                st = self._levels_structs[count] = struct.Struct(f'<{count}f')
+            levels = st.unpack_from(buf, SHM_LEVELS_OFFSET)
+            if _SHM_SEQ.unpack_from(buf, 16)[0] == seq:
+                return Frame(seq, timestamp, levels) if seq else None
 
+    def ids(self):
+        """Ids of the published bars, 'ID#N' per channel with --channels (read without the seqlock)."""
+        base = SHM_LEVELS_OFFSET + 4 * self.capacity
+        out = []
+        for i in range(self.capacity):
+            raw = bytes(self.buf[base + i * self.id_bytes:base + (i + 1) * self.id_bytes]).rstrip(b'\0')
+            if not raw:
+                break
+            out.append(raw.decode('utf-8', 'replace'))
+        return out
 
-# Resolve list of selected device endpoint IDs (strings). If none specified, use default endpoint only.
-selected_ids = []
+    def close(self):
+        self.buf = None
+        self.shm.close()
 
-if args.devices:
-    try:
-        all_devices = AudioUtilities.GetAllDevices()
-    except Exception:
-        all_devices = []
-    for token in args.devices:
-        token = token.strip()
-        chosen = None
-        if token.isdigit():
-            i = int(token)
-            if 0 <= i < len(all_devices):
-                chosen = all_devices[i]
-        else:
-            token_l = token.lower()
-            matches = [d for d in all_devices if token_l in ((getattr(d, "FriendlyName", None) or getattr(d, "friendly_name", None) or str(d)).lower())]
-            if len(matches) == 1:
-                chosen = matches[0]
-            elif len(matches) > 1:
-                # If multiple matches, pick the first for now
-                chosen = matches[0]
-        if chosen is not None:
-            eid = getattr(chosen, "id", None) or getattr(chosen, "Id", None)
-            if not eid and hasattr(chosen, "GetId"):
-                try:
-                    eid = chosen.GetId()
-                except Exception:
-                    eid = None
-            if eid:
-                selected_ids.append(eid)
 
-# If no CLI devices provided, try to load configuration
-if (not args.devices):
-    cfg = load_config()
-    if cfg:
-        try:
-            devices_cfg = cfg.get('devices') or []
-            ids_cfg = [d.get('id') for d in devices_cfg if isinstance(d, dict) and d.get('id')]
-            if ids_cfg:
-                selected_ids = ids_cfg
-        except Exception:
-            pass
+# --- Level broadcast server ---
+#
+# Line protocol (UTF-8 JSON, one object per line). On connect the server sends
+#   {"hello": 1, "ids": [...], "rate": <engine Hz>}
+# and then frames
+#   {"seq": n, "t": <time.time()>, "levels": [...]}
+# A client may send {"rate": HZ} at any time to decimate its own stream (0 = every frame).
+# Frames are never queued per client: a client that cannot keep up gets the newest frame
+# once its socket drains, not a backlog.
 
-# Fallback to default device if still none selected
-if not selected_ids:
-    did = get_default_render_device_id()
-    if did:
-        selected_ids.append(did)
+SERVE_DEFAULT = 'tcp:127.0.0.1:8765'
+# Per-client transport buffer above which drain() waits, and the kernel send buffer we ask for:
+# together they bound how stale the frames queued for a slow client can get
+SERVE_WRITE_HIGH_WATER = 4096
+SERVE_SNDBUF = 8192
 
-# --- Tray Icon handling ---
 
-def _parse_color(c, default):
-    try:
-        if isinstance(c, (tuple, list)) and len(c) >= 3:
-            return (int(c[0]) & 255, int(c[1]) & 255, int(c[2]) & 255)
-        if isinstance(c, str):
-            s = c.strip()
-            if s.startswith('#'):
-                s = s[1:]
-            if len(s) == 6:
-                return (int(s[0:2], 16), int(s[2:4], 16), int(s[4:6], 16))
-    except Exception:
-        pass
-    return default
+def parse_serve_address(spec):
+    """'unix:PATH', 'tcp:HOST:PORT', 'HOST:PORT' or ':PORT' -> ('unix', path) or ('tcp', (host, port))."""
+    if spec.startswith('unix:'):
+        return 'unix', spec[5:]
+    if spec.startswith('tcp:'):
+        spec = spec[4:]
+    host, _, port = spec.rpartition(':')
+    return 'tcp', (host.strip('[]') or '127.0.0.1', int(port))
 
 
-def create_multi_icon(levels, settings=None):
-    size = 32
-    width = size
-    height = size
-    n = max(1, len(levels))
-    # Determine per-bar widths. If settings specify positive widths, use them; else equal split with remainder to first.
-    specified = []
-    remaining = width
-    if settings and len(settings) >= n:
-        for i in range(n):
-            w = max(0, int(settings[i].get('width', 0) or 0))
-            specified.append(w)
-            remaining -= w
-    if not settings or len(settings) < n or remaining < 0 or all(w <= 0 for w in specified):
-        # fallback equal split
-        base = width // n
-        rem = width - base * n
-        first = base + rem
-        bar_widths = [first] + [base] * (n - 1)
-    else:
-        # distribute remaining equally among bars with zero/unspecified width; first gets remainder
-        zeros = [i for i, w in enumerate(specified) if w == 0]
-        if zeros:
-            base = remaining // len(zeros)
-            rem = remaining - base * len(zeros)
-            for k, i in enumerate(zeros):
-                add = base + (rem if k == 0 else 0)
-                specified[i] = add
-        bar_widths = specified[:n]
-    img = Image.new('RGB', (width, height), (0, 0, 0))
-    draw = ImageDraw.Draw(img)
-    x = 0
-    for i, lvl in enumerate(levels):
-        w = bar_widths[i]
-        if w <= 0:
-            continue
-        lvl_clamped = max(0.0, min(1.0, float(lvl)))
-        # Nonlinear display curve: x^(1/f)
-        f = 1.0
-        if settings and i < len(settings):
-            try:
-                f = float(settings[i].get('curve', 1.0))
-            except Exception:
-                f = 1.0
-            if f <= 0:
-                f = 1.0
-        disp = pow(lvl_clamped, 1.0 / f)
-        h = int(round(disp * height))
-        if h <= 0:
-            x += w
-            continue
-        if h > height:
-            h = height
-        y0 = height - h
-        y1 = height - 1
-        # Colors per device
-        if settings and i < len(settings):
-            cols = settings[i].get('colors') or {}
-            low = _parse_color(cols.get('low'), (0, 255, 0))
-            mid = _parse_color(cols.get('mid'), (255, 255, 0))
-            high = _parse_color(cols.get('high'), (255, 0, 0))
-        else:
-            low, mid, high = (0, 255, 0), (255, 255, 0), (255, 0, 0)
-        color = low if disp < 0.8 else (mid if disp < 0.9 else high)
-        draw.rectangle([x, y0, x + w - 1, y1], fill=color)
-        x += w
-    return img
+class _Subscriber:
+    __slots__ = ('writer', 'wake', 'task', 'interval', 'last_sent', 'sent')
 
+    def __init__(self, writer, wake, task):
+        self.writer = writer
+        self.wake = wake
+        self.task = task
+        self.interval = 0.0
+        self.last_sent = 0.0
+        self.sent = 0
 
-def update(icon, endpoint_ids, settings, stop_event):
-    # Initialize COM and activate meters for each endpoint in this thread
-    comtypes.CoInitialize()
-    enumerator = None
-    meters = []
-    try:
-        enumerator = comtypes.CoCreateInstance(
-            CLSID_MMDeviceEnumerator,
-            IMMDeviceEnumerator,
-            CLSCTX_ALL
-        )
-        for eid in endpoint_ids:
-            try:
-                dev = enumerator.GetDevice(eid)
-            except Exception:
-                dev = enumerator.GetDefaultAudioEndpoint(0, 1)
-            m = dev.Activate(IAudioMeterInformation._iid_, CLSCTX_ALL, None)
-            m = cast(m, POINTER(IAudioMeterInformation))
-            meters.append(m)
 
-        while not stop_event.is_set():
-            levels = []
-            for i, m in enumerate(meters):
-                try:
-                    lvl = m.GetPeakValue()
-                except Exception:
-                    lvl = 0.0
-                # Apply per-device gain then clamp
-                gain = 1.0
-                if settings and i < len(settings):
+class LevelBroadcastServer:
+    """Engine listener that serves frames to any number of local subscribers.
+
+    Runs its own asyncio loop on a daemon thread; start() binds (raising on failure) and
+    close() disconnects everyone. `ids` and `rate` are callables for the hello line.
+    """
+
+    def __init__(self, address=SERVE_DEFAULT, ids=None, rate=None):
+        self.kind, self.addr = parse_serve_address(address)
+        self.ids = ids
+        self.rate = rate
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.clients = set()
+        self.latest = None
+        self.seq = 0
+
+    @property
+    def address(self):
+        """Bound address: socket path, or (host, port) with the actual port when 0 was requested."""
+        if self.kind == 'tcp' and self.server is not None and self.server.sockets:
+            return self.server.sockets[0].getsockname()[:2]
+        return self.addr
+
+    def start(self):
+        import asyncio
+        if self.kind == 'unix' and not hasattr(asyncio, 'start_unix_server'):
+            raise ValueError("unix sockets are not available on this platform; use tcp:HOST:PORT")
+        ready = threading.Event()
+        error = []
+
+        def run():
+            loop = self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                if self.kind == 'unix':
                     try:
-                        gain = float(settings[i].get('gain', gain))
-                    except Exception:
-                        gain = 1.0
-                lvl_scaled = max(0.0, min(1.0, lvl * gain))
-                levels.append(lvl_scaled)
-            icon.icon = create_multi_icon(levels, settings)
+                        os.unlink(self.addr)
+                    except OSError:
+                        pass
+                    coro = asyncio.start_unix_server(self._serve_client, self.addr)
+                else:
+                    coro = asyncio.start_server(self._serve_client, *self.addr)
+                self.server = loop.run_until_complete(coro)
+            except Exception as e:
+                error.append(e)
+                ready.set()
+                loop.close()
+                return
+            ready.set()
             try:
-                icon.update_icon()
-            except Exception:
-                pass
-            time.sleep(0.05)
-    finally:
-        # Release COM interfaces while the apartment is still initialized
-        for m in meters:
+                loop.run_forever()
+            finally:
+                loop.close()
+
+        self.thread = threading.Thread(target=run, name='vu-serve', daemon=True)
+        self.thread.start()
+        ready.wait()
+        if error:
+            raise error[0]
+
+    def __call__(self, timestamp, levels):
+        # Worker thread: format once, hand over to the loop only when someone is listening
+        if not self.clients or self.loop is None:
+            return
+        self.seq += 1
+        vals = ','.join([f"{v:.4f}" for v in levels])
+        line = f'{{"seq":{self.seq},"t":{timestamp:.6f},"levels":[{vals}]}}\n'.encode('utf-8')
+        try:
+            self.loop.call_soon_threadsafe(self._publish, (timestamp, line))
+        except RuntimeError:
+            pass  # loop closed during shutdown
+
+    def _publish(self, frame):
+        self.latest = frame
+        for sub in self.clients:
+            sub.wake.set()
+
+    async def _read_requests(self, reader, sub):
+        while True:
+            raw = await reader.readline()
+            if not raw:
+                return
             try:
-                m.Release()
+                rate = float(json.loads(raw).get('rate', 0) or 0)
+                sub.interval = 1.0 / rate if rate > 0 else 0.0
             except Exception:
                 pass
-        if enumerator is not None:
+
+    async def _serve_client(self, reader, writer):
+        import asyncio
+        import socket
+        writer.transport.set_write_buffer_limits(high=SERVE_WRITE_HIGH_WATER)
+        try:
+            writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SERVE_SNDBUF)
+        except Exception:
+            pass
+        sub = _Subscriber(writer, asyncio.Event(), asyncio.current_task())
+        hello = {'hello': 1, 'ids': list(self.ids()) if self.ids else [], 'rate': self.rate() if self.rate else None}
+        requests = asyncio.ensure_future(self._read_requests(reader, sub))
+        # The request reader ends on EOF: that is the client going away
+        requests.add_done_callback(lambda _: sub.task.cancel())
+        self.clients.add(sub)
+        try:
+            writer.write((json.dumps(hello) + '\n').encode('utf-8'))
+            await writer.drain()
+            while True:
+                await sub.wake.wait()
+                sub.wake.clear()
+                timestamp, line = self.latest
+                if sub.interval and timestamp - sub.last_sent < sub.interval - 0.001:
+                    continue
+                sub.last_sent = timestamp
+                writer.write(line)
+                sub.sent += 1
+                # While a slow client drains, newer frames only overwrite self.latest
+                await writer.drain()
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(sub)
+            requests.cancel()
             try:
-                enumerator.Release()
+                writer.close()
             except Exception:
                 pass
+
+    async def _shutdown(self):
+        import asyncio
+        self.server.close()
+        tasks = [sub.task for sub in self.clients]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.server.wait_closed()
+
+    def close(self, timeout=1.0):
+        import asyncio
+        if self.loop is None or self.thread is None:
+            return
         try:
-            comtypes.CoUninitialize()
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout)
         except Exception:
             pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        if self.kind == 'unix':
+            try:
+                os.unlink(self.addr)
+            except OSError:
+                pass
 
-# Event to coordinate shutdown between tray and worker thread
-stop_event = threading.Event()
 
-def on_exit(icon, item):
-    # Signal worker thread to stop, then stop tray loop
-    try:
-        stop_event.set()
-    except Exception:
-        pass
-    icon.stop()
+# --- Tray front-end ---
 
-# Build per-device settings aligned with selected_ids
-settings_from_cfg = None
-if (not args.devices):
-    cfg = load_config()
-    if cfg:
-        try:
-            devices_cfg = cfg.get('devices') or []
-            # normalize
-            norm = []
-            for d in devices_cfg:
-                if not isinstance(d, dict):
-                    continue
-                norm.append({
-                    'id': d.get('id'),
-                    'name': d.get('name', ''),
-                    'gain': float(d.get('gain', 1.0)) if str(d.get('gain', '')).strip() != '' else 1.0,
-                    'curve': float(d.get('curve', 1.0)) if str(d.get('curve', '')).strip() != '' else 1.0,
-                    'width': int(d.get('width', 0) or 0),
-                    'colors': d.get('colors') or {}
-                })
-            settings_from_cfg = norm
-        except Exception:
-            settings_from_cfg = None
-
-# Start with default settings
-_device_settings = []
-for i, eid in enumerate(selected_ids):
-    entry = {
-        'id': eid,
-        'name': '',
-        'gain': 1.0,
-        'curve': 1.0,
-        'width': 0,
-        'colors': {}
-    }
-    if settings_from_cfg and i < len(settings_from_cfg):
-        sc = settings_from_cfg[i]
-        if sc.get('id') == eid:
-            entry.update({k: sc.get(k, entry[k]) for k in ('name','gain','curve','width','colors')})
-    _device_settings.append(entry)
-
-# If CLI gains are provided, override gains of first N devices
-if args.gains:
-    for i, g in enumerate(args.gains):
-        if i < len(_device_settings):
-            try:
-                _device_settings[i]['gain'] = float(g)
-            except Exception:
-                pass
+# The engine driving the tray icon; set by run_tray()
+_engine = None
 
-# Globals for restart capability
-_selected_ids = selected_ids
-_worker = None
 
-def start_worker():
-    global _worker
-    # ensure previous worker stopped
-    if _worker and _worker.is_alive():
+def on_exit(icon, item):
+    # Stop the worker (waiting at most one frame), then stop tray loop
+    if _engine is not None:
         try:
-            stop_event.set()
+            _engine.stop(timeout=_engine.period)
         except Exception:
             pass
-        time.sleep(0.1)
-    try:
-        stop_event.clear()
-    except Exception:
-        pass
-    _worker = threading.Thread(target=update, args=(icon, _selected_ids, [
-        {'gain': d.get('gain', 1.0), 'curve': d.get('curve', 1.0), 'width': d.get('width', 0), 'colors': d.get('colors', {})}
-        for d in _device_settings
-    ], stop_event), daemon=True)
-    _worker.start()
-
+    device_registry.unwatch()
+    icon.stop()
 
-def restart_worker(new_ids, new_settings):
-    global _selected_ids, _device_settings
-    _selected_ids = list(new_ids)
-    _device_settings = list(new_settings)
-    try:
-        stop_event.set()
-    except Exception:
-        pass
-    # give the thread a moment to exit its loop
-    time.sleep(0.2)
-    start_worker()
 
 # Settings window
 
 def open_settings_window():
+    # Tk is only loaded once a window is actually opened
+    import tkinter as tk
+    from tkinter import ttk, messagebox, colorchooser
     # Initialize COM in this UI thread for device enumeration and any COM calls
     coinit = False
     try:
@@ -450,6 +3465,9 @@ def open_settings_window():
             coinit = True
         except Exception:
             pass
+        # Without endpoint notifications nothing invalidates the cache: re-enumerate on every open
+        if not device_registry.watching:
+            device_registry.invalidate(default=True)
         devices = list_all_devices()
         # Map id->name for quick lookup
         id_to_name = {d['id']: d['name'] for d in devices}
@@ -459,13 +3477,14 @@ def open_settings_window():
 
     # Build initial selected list with names
     initial_selected = []
-    for eid in _selected_ids:
+    for eid in _engine.endpoint_ids:
         initial_selected.append({'id': eid, 'name': id_to_name.get(eid, eid)})
 
-    gains_map = {d['id']: d.get('gain', 1.0) for d in _device_settings}
-    curve_map = {d['id']: d.get('curve', 1.0) for d in _device_settings}
-    width_map = {d['id']: d.get('width', 0) for d in _device_settings}
-    colors_map = {d['id']: (d.get('colors') or {}) for d in _device_settings}
+    gains_map = {d['id']: d.get('gain', 1.0) for d in _engine.settings}
+    curve_map = {d['id']: d.get('curve', 1.0) for d in _engine.settings}
+    width_map = {d['id']: d.get('width', 0) for d in _engine.settings}
+    colors_map = {d['id']: (d.get('colors') or {}) for d in _engine.settings}
+    style_map = {d['id']: d.get('style', 'flat') for d in _engine.settings}
 
     root = tk.Tk()
     root.title('VU Meter Settings')
@@ -554,6 +3573,7 @@ def open_settings_window():
     gain_var = tk.StringVar(value='1.0')
     curve_var = tk.StringVar(value='1.0')
     width_var = tk.StringVar(value='0')
+    style_var = tk.StringVar(value='flat')
     color_low_var = tk.StringVar(value='#00FF00')
     color_mid_var = tk.StringVar(value='#FFFF00')
     color_high_var = tk.StringVar(value='#FF0000')
@@ -570,6 +3590,7 @@ def open_settings_window():
             gain_var.set(str(gains_map.get(did, 1.0)))
             curve_var.set(str(curve_map.get(did, 1.0)))
             width_var.set(str(width_map.get(did, 0)))
+            style_var.set(str(style_map.get(did, 'flat')))
             cols = colors_map.get(did, {})
             color_low_var.set(str(cols.get('low', '#00FF00')))
             color_mid_var.set(str(cols.get('mid', '#FFFF00')))
@@ -602,10 +3623,16 @@ def open_settings_window():
 
     # Width
     row3 = ttk.Frame(edit); row3.pack(fill=tk.X, pady=2)
-    ttk.Label(row3, text='Width px (0=auto)').pack(side=tk.LEFT, padx=(0,6))
+    ttk.Label(row3, text='Width px of 32 (0=auto)').pack(side=tk.LEFT, padx=(0,6))
     ttk.Entry(row3, textvariable=width_var, width=8).pack(side=tk.LEFT)
     ttk.Button(row3, text='Set', command=lambda: _apply_for_selected(sel, initial_selected, width_map, width_var, int, 'Width')).pack(side=tk.LEFT, padx=6)
 
+    # Style
+    row5 = ttk.Frame(edit); row5.pack(fill=tk.X, pady=2)
+    ttk.Label(row5, text='Style').pack(side=tk.LEFT, padx=(0,6))
+    ttk.Combobox(row5, textvariable=style_var, values=BAR_STYLES, state='readonly', width=10).pack(side=tk.LEFT)
+    ttk.Button(row5, text='Set', command=lambda: _apply_for_selected(sel, initial_selected, style_map, style_var, str, 'Style')).pack(side=tk.LEFT, padx=6)
+
     # Colors
     row4 = ttk.Frame(edit); row4.pack(fill=tk.X, pady=2)
     ttk.Label(row4, text='Colors:').pack(side=tk.LEFT)
@@ -678,14 +3705,15 @@ def open_settings_window():
                 'gain': gains_map.get(eid, 1.0),
                 'curve': curve_map.get(eid, 1.0),
                 'width': width_map.get(eid, 0),
+                'style': style_map.get(eid, 'flat'),
                 'colors': colors_map.get(eid, {})
             }
             ordered_devices.append(dev)
         ok = save_config(ordered_devices)
         if not ok:
             messagebox.showwarning('Save', 'Failed to save configuration file.')
-        # Apply immediately
-        restart_worker(ordered_ids, ordered_devices)
+        # Apply immediately, in place
+        _engine.reconfigure(ordered_ids, ordered_devices)
         root.destroy()
         # Uninitialize COM for this UI thread if we initialized it
         try:
@@ -719,30 +3747,28 @@ def on_settings(icon, item):
     threading.Thread(target=open_settings_window, daemon=True).start()
 
 
-def _show_about_dialog():
+def _show_text_dialog(title, get_text, geometry='520x220', refresh_ms=None, monospace=False):
+    """Read-only, copyable text window; with refresh_ms the text is re-read from get_text() periodically."""
+    import tkinter as tk
+    from tkinter import ttk, messagebox
     root = None
     top = None
+    text_content = ''
     try:
         # Create hidden root
         root = tk.Tk()
         root.withdraw()
 
-        # Build about text
-        text_content = (
-            'VU Meter\n\n'
-            'A simple Windows system tray VU meter using Pycaw and Pystray.\n\n'
-            f'Config: {CONFIG_PATH}\n'
-            'Author: Matija Arh (dot in between and google domain)\n'
-        )
+        text_content = get_text()
 
         # Create a Toplevel window to allow selectable/copyable text
         top = tk.Toplevel(root)
-        top.title('About VU Meter')
+        top.title(title)
         try:
             top.attributes('-topmost', True)
         except Exception:
             pass
-        top.geometry('520x220')
+        top.geometry(geometry)
         try:
             top.resizable(True, True)
         except Exception:
@@ -754,6 +3780,8 @@ def _show_about_dialog():
 
         # Scrollable, selectable text (read-only)
         text_widget = tk.Text(container, wrap='word', height=8, width=60)
+        if monospace:
+            text_widget.config(wrap='none', font=('Consolas', 9))
         text_widget.pack(fill=tk.BOTH, expand=True)
         text_widget.insert('1.0', text_content)
         # Make read-only but keep selection/copy; use disabled state after binding
@@ -810,6 +3838,23 @@ def _show_about_dialog():
 
         enable_copy_bindings(text_widget)
 
+        def refresh():
+            nonlocal text_content
+            try:
+                text_content = get_text()
+                # Leave the text alone while the user has something selected to copy
+                if not text_widget.tag_ranges('sel'):
+                    text_widget.config(state='normal')
+                    text_widget.delete('1.0', 'end')
+                    text_widget.insert('1.0', text_content)
+                    text_widget.config(state='disabled')
+            except Exception:
+                pass
+            top.after(refresh_ms, refresh)
+
+        if refresh_ms:
+            top.after(refresh_ms, refresh)
+
         # Close button
         btn_frame = ttk.Frame(container)
         btn_frame.pack(fill=tk.X, pady=(8, 0))
@@ -840,7 +3885,7 @@ def _show_about_dialog():
     except Exception:
         # As a last resort, fall back to a simple messagebox
         try:
-            messagebox.showinfo('About VU Meter', text_content)
+            messagebox.showinfo(title, text_content)
         except Exception:
             pass
     finally:
@@ -857,18 +3902,288 @@ def _show_about_dialog():
             pass
 
 
+def _about_text():
+    return (
+        'VU Meter\n\n'
+        'A simple Windows system tray VU meter using Pycaw and Pystray.\n\n'
+        f'Config: {CONFIG_PATH}\n'
+        'Author: Matija Arh (dot in between and google domain)\n'
+    )
+
+
+def _show_about_dialog():
+    _show_text_dialog('About VU Meter', _about_text)
+
+
+def _show_diagnostics_dialog():
+    _show_text_dialog('VU Meter Diagnostics', lambda: format_diagnostics(_engine.diagnostics()),
+                      geometry='760x420', refresh_ms=1000, monospace=True)
+
+
+def on_diagnostics(icon, item):
+    threading.Thread(target=_show_diagnostics_dialog, daemon=True).start()
+
+
+PROFILE_MENU_SECONDS = 10
+
+
+def on_profile_worker(icon, item):
+    def done(prof_path, text_path):
+        try:
+            icon.notify(f'Profile written to {text_path}', 'VU Meter')
+        except Exception:
+            pass
+    _engine.profile(PROFILE_MENU_SECONDS, done)
+
+
 def on_about(icon, item):
     threading.Thread(target=_show_about_dialog, daemon=True).start()
 
-# Create initial icon image and tray menu
-initial_img = Image.new('RGB', (32, 32), (0, 0, 0))
-menu = pystray.Menu(
-    pystray.MenuItem('Settings…', on_settings),
-    pystray.MenuItem('About', on_about),
-    pystray.Menu.SEPARATOR,
-    pystray.MenuItem('Exit', on_exit)
-)
-icon = pystray.Icon('VU Meter', icon=initial_img, title='VU Meter', menu=menu)
-
-start_worker()
-icon.run()
+# GetSystemMetrics index of the large icon width, the size pystray loads its icon at
+SM_CXICON = 11
+
+
+def detect_icon_size():
+    """Icon canvas in pixels that the tray backend actually uses, snapped to ICON_SIZES.
+
+    pystray's win32 backend loads the image with LoadImage(..., LR_DEFAULTSIZE), i.e.
+    at SM_CXICON for this process (32 px unless it is DPI-aware), and the shell scales
+    that to the tray. Rendering at any other size adds a second resampling and blurs
+    the bars. Off Windows, or if the query fails, ICON_SIZE is used.
+    """
+    try:
+        size = ctypes.windll.user32.GetSystemMetrics(SM_CXICON)
+    except Exception:
+        size = 0
+    if not size or size <= 0:
+        return ICON_SIZE
+    return min(ICON_SIZES, key=lambda s: (abs(s - size), -s))
+
+
+def _on_icon_ready(icon):
+    icon.visible = True
+    startup_profile.mark('first icon shown')
+
+
+def run_tray(engine):
+    """Show the tray icon driven by `engine` and block until Exit."""
+    global _engine
+    import pystray
+    from PIL import Image
+    _engine = engine
+    # Create initial icon image and tray menu
+    initial_img = Image.new('RGB', (engine.size, engine.size), (0, 0, 0))
+    menu = pystray.Menu(
+        pystray.MenuItem('Settings…', on_settings),
+        pystray.MenuItem('Diagnostics…', on_diagnostics),
+        pystray.MenuItem(f'Profile worker ({PROFILE_MENU_SECONDS} s)', on_profile_worker),
+        pystray.MenuItem('About', on_about),
+        pystray.Menu.SEPARATOR,
+        pystray.MenuItem('Exit', on_exit)
+    )
+    icon = pystray.Icon('VU Meter', icon=initial_img, title='VU Meter', menu=menu)
+    engine.icon = icon
+    engine.start()
+    # Keep the device registry current while the tray runs (no-op without pycaw notification support)
+    device_registry.watch()
+    icon.run(setup=_on_icon_ready)
+
+
+# --- Command line ---
+
+def build_arg_parser():
+    # Argument parsing for device selection/listing
+    parser = argparse.ArgumentParser(description="System tray VU meter using pycaw")
+    parser.add_argument("--list-devices", action="store_true", help="List available audio endpoint devices and exit")
+    parser.add_argument("--devices", nargs="+", help="One or more device indices or name substrings. Omit to use default render device")
+    parser.add_argument("--gains", nargs="+", type=float, help="Per-device gains (one per device). If fewer than devices, remaining default to 1.0")
+    parser.add_argument("--source", default="pycaw", help="Meter source: pycaw (default), synthetic[:sine|bursts|noise[:COUNT]], wav:PATH, fifo:PATH[:CHANNELS] or replay:PATH[:fast][:once]")
+    parser.add_argument("--bench", action="store_true", help="Benchmark the sample/render/publish pipeline headless and print JSON results")
+    parser.add_argument("--bench-frames", type=int, default=400, help="Frames timed per benchmark case (default 400)")
+    parser.add_argument("--bench-pattern", choices=SyntheticMeterSource.PATTERNS, default="noise", help="Synthetic level pattern used by --bench (default noise)")
+    parser.add_argument("--rate", type=float, default=20.0, help="Target icon frame rate in Hz (default 20)")
+    parser.add_argument("--idle-rate", type=float, default=2.0, help="Frame rate after --idle-after seconds of silence (default 2; 0 disables back-off)")
+    parser.add_argument("--idle-after", type=float, default=5.0, help="Seconds of all-silent meters before dropping to --idle-rate (default 5)")
+    parser.add_argument("--sample-rate", type=float, default=0.0, help="Poll meters on a separate thread at this rate in Hz (e.g. 200) and show the max since the last frame; 0 = once per frame (default)")
+    parser.add_argument("--ballistics", choices=sorted(BALLISTICS_PRESETS), default="none", help="Meter ballistics preset (default none)")
+    parser.add_argument("--attack-ms", type=float, help="Override the ballistics attack time constant")
+    parser.add_argument("--release-ms", type=float, help="Override the ballistics release time constant")
+    parser.add_argument("--hold-ms", type=float, help="Peak hold before release starts")
+    parser.add_argument("--profile-startup", action="store_true", help="Print a per-phase startup timing breakdown once the tray icon is shown (the first frame with --headless)")
+    parser.add_argument("--headless", action="store_true", help="No tray icon: stream timestamped levels at --rate to stdout (or --udp) until interrupted")
+    parser.add_argument("--format", choices=LevelStream.FORMATS, default="csv", help="Headless output format (default csv)")
+    parser.add_argument("--udp", metavar="HOST:PORT", help="Headless: send lines as UDP datagrams instead of writing to stdout")
+    parser.add_argument("--on-change", action="store_true", help="Headless: only emit a line when a level changed")
+    parser.add_argument("--duration", type=float, help="Headless: stop after this many seconds")
+    parser.add_argument("--shm", nargs="?", const=SHM_NAME, metavar="NAME", help=f"Publish each frame's levels into a shared-memory block for other processes (default name {SHM_NAME})")
+    parser.add_argument("--serve", nargs="?", const=SERVE_DEFAULT, metavar="ADDR", help=f"Push level frames to local subscribers on tcp:HOST:PORT or unix:PATH (default {SERVE_DEFAULT})")
+    parser.add_argument("--record", metavar="PATH", help="Append every raw meter read with its timestamp to a binary recording (replay with --source replay:PATH)")
+    parser.add_argument("--bench-replay", metavar="PATH", help="Benchmark with the levels of a --record file instead of --bench-pattern")
+    parser.add_argument("--stats-file", nargs="?", const=STATS_PATH, metavar="PATH", help=f"Append frame timing/health statistics as JSON lines (default {STATS_PATH})")
+    parser.add_argument("--stats-interval", type=float, default=60.0, help="Seconds between --stats-file lines (default 60)")
+    parser.add_argument("--profile-worker", type=float, metavar="SECONDS", help="cProfile the worker thread for the first SECONDS and write .prof and .txt files to the config directory")
+    parser.add_argument("--icon-size", default="auto", choices=["auto"] + [str(n) for n in ICON_SIZES], help="Icon canvas in pixels; auto matches the size the tray backend loads the icon at (default, 32 px for this process)")
+    parser.add_argument("--channels", action="store_true", help="One sub-bar per channel inside each device's width (pycaw and fake sources)")
+    parser.add_argument("--history", nargs="?", type=float, const=HISTORY_SECONDS, default=0.0, metavar="SECONDS", help=f"Show a scrolling history of the last SECONDS (default {HISTORY_SECONDS:g}) of each device's level instead of bars")
+    parser.add_argument("--renderer", choices=["auto", "framebuffer", "numpy", "draw"], default="auto", help=f"Icon renderer: auto (default: numpy from {AUTO_NUMPY_MIN_BARS} bars if installed, else framebuffer), preallocated palette framebuffer, NumPy-vectorized, or ImageDraw per frame")
+    return parser
+
+
+def print_device_list():
+    # One enumeration resolves stable endpoint IDs, names and states
+    devices_simple = list_all_devices()
+    if not devices_simple:
+        print("No devices found.")
+    else:
+        for idx, d in enumerate(devices_simple):
+            name = d.get('name')
+            did = d.get('id')
+            state = d.get('state')
+            state_part = f" (state={state})" if state is not None else ""
+            print(f"[{idx}] {name} | id={did}{state_part}")
+
+
+def resolve_selection(device_tokens=None, gains=None, cfg=None):
+    """Endpoint ids and per-device settings from CLI tokens, else the config, else the default device."""
+    # Resolve list of selected device endpoint IDs (strings). If none specified, use default endpoint only.
+    selected_ids = []
+
+    if device_tokens:
+        for token in device_tokens:
+            eid = device_registry.find(token)
+            if eid:
+                selected_ids.append(eid)
+
+    # If no CLI devices provided, try to load configuration
+    if (not device_tokens):
+        if cfg:
+            try:
+                devices_cfg = cfg.get('devices') or []
+                ids_cfg = [d.get('id') for d in devices_cfg if isinstance(d, dict) and d.get('id')]
+                if ids_cfg:
+                    selected_ids = ids_cfg
+            except Exception:
+                pass
+
+    # Fallback to default device if still none selected
+    if not selected_ids:
+        did = get_default_render_device_id()
+        if did:
+            selected_ids.append(did)
+
+    # Build per-device settings aligned with selected_ids
+    settings_from_cfg = None
+    if (not device_tokens):
+        if cfg:
+            try:
+                devices_cfg = cfg.get('devices') or []
+                # normalize
+                norm = []
+                for d in devices_cfg:
+                    if not isinstance(d, dict):
+                        continue
+                    norm.append({
+                        'id': d.get('id'),
+                        'name': d.get('name', ''),
+                        'gain': float(d.get('gain', 1.0)) if str(d.get('gain', '')).strip() != '' else 1.0,
+                        'curve': float(d.get('curve', 1.0)) if str(d.get('curve', '')).strip() != '' else 1.0,
+                        'width': int(d.get('width', 0) or 0),
+                        'style': d.get('style') if d.get('style') in BAR_STYLES else 'flat',
+                        'colors': d.get('colors') or {}
+                    })
+                settings_from_cfg = norm
+            except Exception:
+                settings_from_cfg = None
+
+    # Start with default settings
+    device_settings = []
+    for i, eid in enumerate(selected_ids):
+        entry = {
+            'id': eid,
+            'name': '',
+            'gain': 1.0,
+            'curve': 1.0,
+            'width': 0,
+            'style': 'flat',
+            'colors': {}
+        }
+        if settings_from_cfg and i < len(settings_from_cfg):
+            sc = settings_from_cfg[i]
+            if sc.get('id') == eid:
+                entry.update({k: sc.get(k, entry[k]) for k in ('name','gain','curve','width','style','colors')})
+        device_settings.append(entry)
+
+    # If CLI gains are provided, override gains of first N devices
+    if gains:
+        for i, g in enumerate(gains):
+            if i < len(device_settings):
+                try:
+                    device_settings[i]['gain'] = float(g)
+                except Exception:
+                    pass
+    return selected_ids, device_settings
+
+
+def engine_from_args(args, selected_ids, device_settings):
+    return VUEngine(selected_ids, device_settings, source=args.source, renderer=args.renderer, rate=args.rate,
+                    idle_rate=args.idle_rate, idle_after=args.idle_after, sample_rate=args.sample_rate,
+                    ballistics=args.ballistics, attack_ms=args.attack_ms, release_ms=args.release_ms,
+                    hold_ms=args.hold_ms, record=args.record, history=args.history, per_channel=args.channels,
+                    size=detect_icon_size() if args.icon_size == 'auto' else int(args.icon_size))
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    # Handle device listing
+    if args.list_devices:
+        print_device_list()
+        return 0
+
+    if args.bench:
+        print(json.dumps(run_bench(frames=max(1, args.bench_frames), pattern=args.bench_pattern,
+                                   replay=args.bench_replay), indent=2))
+        return 0
+
+    startup_profile.enabled = args.profile_startup
+    if args.headless:
+        startup_profile.skip('first icon shown')
+
+    # Load the configuration once; it provides both the device selection and per-device settings
+    cfg = load_config() if not args.devices else None
+    startup_profile.mark('config load')
+    selected_ids, device_settings = resolve_selection(args.devices, args.gains, cfg)
+    startup_profile.mark('device resolution')
+
+    engine = engine_from_args(args, selected_ids, device_settings)
+    # Optional outputs that share this process's meters with other programs
+    outputs = []
+    if args.shm:
+        outputs.append(SharedLevelPublisher(args.shm, ids=engine.bar_ids))
+    if args.serve:
+        server = LevelBroadcastServer(args.serve, ids=engine.bar_ids, rate=lambda: engine.rate)
+        server.start()
+        outputs.append(server)
+    for out in outputs:
+        engine.add_listener(out)
+    if args.profile_worker:
+        engine.profile(args.profile_worker,
+                       lambda prof, text: print(f"Worker profile written to {prof} and {text}", file=sys.stderr))
+    if args.stats_file:
+        stats = StatsLogger(engine, args.stats_file, args.stats_interval)
+        stats.start()
+        outputs.append(stats)
+    try:
+        if args.headless:
+            return run_headless(engine, args.format, args.on_change, args.udp, args.duration)
+        run_tray(engine)
+        return 0
+    finally:
+        if outputs:
+            engine.stop()
+            for out in outputs:
+                out.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
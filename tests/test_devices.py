@@ -0,0 +1,57 @@
+import main
+
+DEVICES = [
+    {'id': '{a}', 'name': 'Speakers (Realtek)', 'state': 1},
+    {'id': '{b}', 'name': 'Headphones', 'state': 1},
+]
+
+
+def test_registry_enumerates_once_and_resolves_tokens():
+    fake = main.FakeDeviceNotifier(DEVICES, default_id='{a}')
+    reg = fake.registry
+    assert [d['id'] for d in reg.devices()] == ['{a}', '{b}']
+    assert reg.find('{b}') == '{b}'
+    assert reg.find('1') == '{b}'
+    assert reg.find('headphones') == '{b}'
+    assert reg.find('realtek') == '{a}'
+    assert reg.find('9') is None
+    assert reg.find('nothing') is None
+    assert reg.name_of('{a}') == 'Speakers (Realtek)'
+    assert reg.default_render_id() == '{a}'
+    assert reg.enumerations == 1
+
+
+def test_notifications_invalidate_and_update_default():
+    fake = main.FakeDeviceNotifier(DEVICES, default_id='{a}')
+    reg = fake.registry
+    reg.devices()
+    fake.add('{c}', 'USB DAC')
+    assert reg.find('usb') == '{c}'
+    assert reg.enumerations == 2
+    fake.remove('{a}')
+    assert reg.get('{a}') is None
+    assert reg.enumerations == 3
+    fake.set_default('{b}')
+    assert reg.default_render_id() == '{b}'
+    assert reg.enumerations == 3
+
+
+def test_invalidate_default_requeries_default():
+    fake = main.FakeDeviceNotifier(DEVICES, default_id='{a}')
+    reg = fake.registry
+    assert reg.default_render_id() == '{a}'
+    fake.default_id = '{b}'
+    reg.invalidate()
+    assert reg.default_render_id() == '{a}'
+    reg.invalidate(default=True)
+    assert reg.default_render_id() == '{b}'
+
+
+def test_watch_reports_unavailable_notifications(monkeypatch):
+    def unavailable(registry):
+        raise ImportError('no pycaw callbacks')
+
+    monkeypatch.setattr(main, '_register_endpoint_notifications', unavailable)
+    reg = main.FakeDeviceNotifier(DEVICES).registry
+    assert reg.watch() is False
+    assert not reg.watching
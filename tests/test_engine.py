@@ -0,0 +1,305 @@
+import io
+import threading
+import time
+
+import pytest
+
+import main
+
+
+class ListSource(main.MeterSource):
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.count = len(self.frames[0])
+
+    def read(self):
+        return self.frames.pop(0)
+
+
+def test_pipeline_tracks_silence_without_an_icon():
+    plan = main.compile_render_plan([{}, {}])
+    source = ListSource([[0.0, 0.0], [0.9, 0.0], [0.0, 0.0]])
+    pipeline = main.FramePipeline(source, plan, None, None)
+    assert pipeline.step() is False
+    assert pipeline.silent
+    pipeline.step()
+    assert not pipeline.silent
+    pipeline.step()
+    assert pipeline.silent
+
+
+def test_headless_engine_keeps_full_rate_while_loud():
+    engine = main.VUEngine(source='synthetic:sine:2', rate=50, idle_after=0.2)
+    engine.start()
+    try:
+        counts = [0, 0]
+        t0 = time.monotonic()
+        for frame in engine.frames(timeout=2.0):
+            elapsed = time.monotonic() - t0
+            if elapsed >= 1.0:
+                break
+            counts[elapsed >= 0.5] += 1
+            assert max(frame.levels) > 0.0
+        # Both halves run near 50 Hz; the idle rate (2 Hz) would give about one frame
+        assert counts[1] >= 15
+        assert not engine.diagnostics()['idle']
+    finally:
+        engine.stop()
+
+
+class ShellIcon:
+    """Like pystray.Icon: assigning the image is what pushes it to the shell."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self._icon = None
+        self.updates = 0
+
+    @property
+    def icon(self):
+        return self._icon
+
+    @icon.setter
+    def icon(self, value):
+        time.sleep(self.delay)
+        self._icon = value
+        self.updates += 1
+
+
+def test_shell_time_is_not_counted_as_render(monkeypatch):
+    pytest.importorskip('PIL')
+    metrics = main.FrameMetrics()
+    monkeypatch.setattr(main, 'frame_metrics', metrics)
+    plan = main.compile_render_plan([{}])
+    icon = ShellIcon(0.02)
+    pipeline = main.FramePipeline(ListSource([[0.2], [0.6], [1.0]]), plan, main.FrameBufferRenderer(plan), icon)
+    for _ in range(3):
+        assert pipeline.step()
+    assert icon.updates == 3
+    assert metrics.update_icon.count == 3
+    assert metrics.update_icon.percentile(50) >= 0.015
+    assert metrics.render.max < 0.015
+
+
+class _User32:
+    def __init__(self, cx):
+        self.cx = cx
+
+    def GetSystemMetrics(self, index):
+        assert index == main.SM_CXICON
+        return self.cx
+
+
+class _Ctypes:
+    def __init__(self, cx):
+        self.windll = type('windll', (), {'user32': _User32(cx)})()
+
+
+@pytest.mark.parametrize('cx, size', [(32, 32), (48, 48), (30, 32), (0, main.ICON_SIZE)])
+def test_icon_size_follows_the_backend_load_size(monkeypatch, cx, size):
+    monkeypatch.setattr(main, 'ctypes', _Ctypes(cx))
+    assert main.detect_icon_size() == size
+
+
+def test_icon_size_off_windows():
+    # No ctypes.windll here: the fallback size
+    if hasattr(main.ctypes, 'windll'):
+        pytest.skip('Windows')
+    assert main.detect_icon_size() == main.ICON_SIZE
+
+
+@pytest.mark.parametrize('size', main.ICON_SIZES)
+def test_engine_renders_at_every_icon_size(size):
+    pytest.importorskip('PIL')
+    icon = ShellIcon(0.0)
+    engine = main.VUEngine(source='synthetic:sine:3', settings=[{}, {'width': 10}, {}], icon=icon, size=size,
+                           renderer='framebuffer')
+    engine.start()
+    try:
+        deadline = time.monotonic() + 2.0
+        while icon.updates < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert icon.updates >= 3
+        assert icon.icon.size == (size, size)
+    finally:
+        engine.stop()
+
+
+def test_bar_ids_name_every_channel():
+    engine = main.VUEngine(['{a}', '{b}'], source='fake:2,1', per_channel=True)
+    assert engine.bar_ids() == ['{a}', '{b}']
+    engine.start()
+    try:
+        next(engine.frames(timeout=2.0))
+        ids = engine.bar_ids()
+        assert ids == ['fake:0#0', 'fake:0#1', 'fake:1#0']
+        assert engine.bar_ids() is ids
+    finally:
+        engine.stop()
+
+
+def test_shared_memory_ids_follow_bars():
+    pytest.importorskip('multiprocessing.shared_memory')
+    name = f'vu_test_{time.monotonic_ns()}'
+    engine = main.VUEngine(source='fake:2,1', per_channel=True)
+    publisher = main.SharedLevelPublisher(name, capacity=8, ids=engine.bar_ids)
+    engine.add_listener(publisher)
+    engine.start()
+    try:
+        frame = next(engine.frames(timeout=2.0))
+        reader = main.SharedLevelReader(name)
+        try:
+            assert len(frame.levels) == 3
+            assert reader.ids() == ['fake:0#0', 'fake:0#1', 'fake:1#0']
+            assert len(reader.read().levels) == 3
+        finally:
+            reader.close()
+    finally:
+        engine.stop()
+        publisher.close()
+
+
+def test_unchanged_frames_are_skipped(monkeypatch):
+    pytest.importorskip('PIL')
+    monkeypatch.setattr(main, 'frame_stats', {'rendered': 0, 'skipped': 0})
+    plan = main.compile_render_plan([{}, {}])
+    icon = ShellIcon(0.0)
+    # 0.5 and 0.501 land on the same bar height and color at 32 px
+    source = ListSource([[0.5, 0.25], [0.501, 0.25], [0.9, 0.25]])
+    pipeline = main.FramePipeline(source, plan, main.FrameBufferRenderer(plan), icon)
+    assert pipeline.step() is True
+    assert pipeline.step() is False
+    assert main.frame_stats == {'rendered': 1, 'skipped': 1}
+    assert icon.updates == 1
+    assert pipeline.step() is True
+    assert main.frame_stats == {'rendered': 2, 'skipped': 1}
+    assert icon.updates == 2
+
+
+class _ConstMeter:
+    def GetPeakValue(self):
+        return 0.5
+
+    def Release(self):
+        pass
+
+
+class CountingEndpoints(main.FakeEndpointMeterSource):
+    """Fake endpoints that follow the device selection like live ones, counting activations per id."""
+
+    def __init__(self, endpoint_ids):
+        main.PycawMeterSource.__init__(self, endpoint_ids)
+        self.activations = {}
+
+    def _activate(self, enumerator, eid):
+        self.activations[eid] = self.activations.get(eid, 0) + 1
+        return _ConstMeter()
+
+    set_endpoints = main.PycawMeterSource.set_endpoints
+
+
+def _wait(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return predicate()
+
+
+def test_reconfigure_keeps_selected_meters(monkeypatch):
+    sources = []
+
+    def make_source(spec, endpoint_ids, per_channel=False):
+        sources.append(CountingEndpoints(endpoint_ids))
+        return sources[-1]
+
+    monkeypatch.setattr(main, 'make_meter_source', make_source)
+    engine = main.VUEngine(['a', 'b'], [{'id': 'a'}, {'id': 'b'}], rate=100, idle_rate=0)
+    frames = []
+    engine.add_listener(lambda t, levels: frames.append(list(levels)))
+    engine.start()
+    try:
+        assert _wait(lambda: frames and frames[-1] == [0.5, 0.5])
+        worker = engine._worker
+        generation = worker.generation
+        engine.reconfigure(['b', 'c'], [{'id': 'b', 'gain': 2.0}, {'id': 'c', 'gain': 0.0}])
+        seen = len(frames)
+        # The gains apply from the next frame on; 'c' reads 0 until its meter is activated anyway
+        assert _wait(lambda: len(frames) > seen + 1)
+        assert frames[seen + 1] == [1.0, 0.0]
+        assert _wait(lambda: worker.source.health() == ['ok', 'ok'])
+        assert engine._worker is worker
+        assert worker.generation == generation
+        assert main.lifecycle_stats['generation'] == generation
+        assert len(sources) == 1
+        assert sources[0].activations == {'a': 1, 'b': 1, 'c': 1}
+        assert [spec.gain for spec in worker.plan.devices] == [2.0, 0.0]
+    finally:
+        engine.stop()
+
+
+def test_worker_stops_within_one_period():
+    pytest.importorskip('PIL')
+    engine = main.VUEngine(source='synthetic:sine:2', rate=20, icon=ShellIcon(0.0))
+    engine.start()
+    worker = engine._worker
+    assert _wait(lambda: worker.icon.updates > 0)
+    t0 = time.monotonic()
+    assert engine.stop(timeout=engine.period) is True
+    assert time.monotonic() - t0 < engine.period
+    assert not worker.is_alive()
+
+
+class GatedSource(main.MeterSource):
+    """Blocks in read() until released, so a stop can arrive mid-frame."""
+
+    count = 1
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def read(self):
+        self.entered.set()
+        self.release.wait(2.0)
+        self.release.clear()
+        return [0.9]
+
+
+def test_stopped_worker_never_publishes_again():
+    pytest.importorskip('PIL')
+    icon = ShellIcon(0.0)
+    source = GatedSource()
+    plan = main.compile_render_plan([{}])
+    worker = main.MeterWorker(icon, source, plan, 'framebuffer', main.FrameScheduler(100, 0, 0))
+    worker.start()
+    try:
+        assert source.entered.wait(2.0)
+        # Stop while the frame is still reading its meters, then let the read finish
+        assert worker.stop(timeout=0.0) is False
+        source.release.set()
+        worker.join(2.0)
+        assert not worker.is_alive()
+        assert icon.updates == 0
+    finally:
+        source.release.set()
+        worker.stop()
+
+
+class _Stdout:
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+
+def test_headless_csv_header_names_every_channel(monkeypatch):
+    out = _Stdout()
+    monkeypatch.setattr(main.sys, 'stdout', out)
+    settings = [{'id': '{a}', 'name': 'Speakers'}, {'id': '{b}', 'name': 'Headset'}]
+    engine = main.VUEngine(['{a}', '{b}'], settings, source='fake:2,2', per_channel=True)
+    main.run_headless(engine, 'csv', duration=0.2)
+    header = out.buffer.getvalue().decode('utf-8').splitlines()[0]
+    assert header == 'timestamp,Speakers#0,Speakers#1,Headset#0,Headset#1'
+
+
+def test_bar_names_without_channels():
+    engine = main.VUEngine(['{a}'], [{'id': '{a}', 'name': 'Speakers'}, {'id': '{b}'}])
+    assert engine.bar_names() == ['Speakers', '{b}']
@@ -0,0 +1,124 @@
+import itertools
+import random
+
+import pytest
+
+pytest.importorskip('PIL')
+
+import main
+
+SETTINGS = [
+    [{}],
+    [{'curve': 2.0}, {'curve': 0.5, 'colors': {'low': '#0080ff', 'mid': '#ffffff', 'high': '#ff00ff'}}],
+    [{'width': 5, 'gain': 2.0}, {'width': 0}, {'width': 11, 'curve': 3.0, 'colors': {'low': [10, 20, 30]}}],
+    [{'width': 0}] * 7,
+    [{'style': 'gradient'}, {'style': 'segments', 'curve': 1.5}, {}],
+]
+LEVELS = [0.0, 0.001, 0.25, 0.5, 0.79, 0.8, 0.85, 0.9, 0.95, 1.0, -0.5, 1.5, 7.0, float('nan')]
+
+
+def _pixels(img):
+    return img.convert('RGB').tobytes()
+
+
+def _level_sets(n, rng):
+    yield [0.0] * n
+    yield [1.0] * n
+    for combo in itertools.islice(itertools.product(LEVELS, repeat=min(n, 2)), 60):
+        yield [combo[i % len(combo)] for i in range(n)]
+    for _ in range(40):
+        yield [rng.choice(LEVELS + [rng.random()]) for _ in range(n)]
+
+
+@pytest.mark.parametrize('size', main.ICON_SIZES)
+@pytest.mark.parametrize('settings', SETTINGS)
+def test_framebuffer_matches_draw_renderer(size, settings):
+    plan = main.compile_render_plan(settings, size=size)
+    framebuffer = main.FrameBufferRenderer(plan)
+    draw = main.DrawRenderer(plan)
+    rng = random.Random(size)
+    for levels in _level_sets(len(plan.devices), rng):
+        assert _pixels(framebuffer.render(levels)) == _pixels(draw.render(levels)), levels
+
+
+def test_framebuffer_reuses_one_image():
+    plan = main.compile_render_plan([{}, {}], size=32)
+    renderer = main.FrameBufferRenderer(plan)
+    first = renderer.render([1.0, 0.2])
+    assert renderer.render([0.0, 0.0]) is first
+    assert _pixels(first) == bytes(32 * 32 * 3)
+
+
+@pytest.mark.parametrize('size', main.ICON_SIZES)
+@pytest.mark.parametrize('settings', SETTINGS)
+def test_numpy_matches_draw_renderer(size, settings):
+    pytest.importorskip('numpy')
+    plan = main.compile_render_plan(settings, size=size)
+    numpy_renderer = main.NumpyRenderer(plan)
+    draw = main.DrawRenderer(plan)
+    rng = random.Random(size)
+    for levels in _level_sets(len(plan.devices), rng):
+        assert _pixels(numpy_renderer.render(levels)) == _pixels(draw.render(levels)), levels
+
+
+def test_auto_picks_numpy_for_many_bars():
+    pytest.importorskip('numpy')
+    few = main.compile_render_plan([{}] * 2)
+    many = main.compile_render_plan([{}] * main.AUTO_NUMPY_MIN_BARS)
+    assert isinstance(main.make_renderer(few, 'auto'), main.FrameBufferRenderer)
+    assert isinstance(main.make_renderer(many, 'auto'), main.NumpyRenderer)
+
+
+@pytest.mark.parametrize('mode', ['framebuffer', 'numpy'])
+def test_short_levels_leave_missing_bars_empty(mode):
+    if mode == 'numpy':
+        pytest.importorskip('numpy')
+    plan = main.compile_render_plan([{}, {}, {}], size=32)
+    renderer = main.RENDERERS[mode](plan)
+    draw = main.DrawRenderer(plan)
+    renderer.render([1.0, 1.0, 1.0])
+    assert _pixels(renderer.render([0.5, 0.75])) == _pixels(draw.render([0.5, 0.75]))
+    assert _pixels(renderer.render([])) == bytes(32 * 32 * 3)
+
+
+class FakeClock:
+    def __init__(self, t=0.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.mark.parametrize('size', [16, 32, 48])
+@pytest.mark.parametrize('settings', [[{}], [{'curve': 2.0}, {'colors': {'low': '#0080ff'}}, {}]])
+def test_history_scrolls_in_place_like_a_redraw(size, settings):
+    plan = main.compile_render_plan(settings, size=size)
+    clock = FakeClock(10.0)
+    seconds = 2.0
+    hr = main.HistoryRenderer(plan, seconds, clock=clock)
+    rng = random.Random(size)
+    for _ in range(300):
+        # Intervals from a fraction of a column to several columns at once
+        clock.t += rng.choice([0.1, 0.5, 1.0, 3.0, 0.0]) * hr.column_period * rng.random() * 2
+        levels = [rng.random() for _ in plan.devices]
+        hr.advance(levels)
+        hr.render(levels)
+        fresh = main.HistoryRenderer(plan, seconds, rings=hr.history(), clock=clock)
+        assert bytes(hr.buffer) == bytes(fresh.buffer)
+
+
+def test_history_key_changes_only_when_a_column_is_due():
+    plan = main.compile_render_plan([{}], size=16)
+    clock = FakeClock()
+    hr = main.HistoryRenderer(plan, 1.6, clock=clock)  # 0.1 s per column
+    key = hr.advance([0.5])
+    clock.t = 0.05
+    assert hr.advance([0.9]) == key
+    clock.t = 0.1
+    later = hr.advance([0.1])
+    assert later != key
+    clock.t = 0.19
+    assert hr.advance([0.1]) == later
+    # The new column shows the peak of the frames in it
+    hr.render([0.1])
+    assert hr.history()[0][-1] == pytest.approx(0.9)
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+import main
+
+
+class FakeClock:
+    def __init__(self, t=0.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+class CountingSource(main.MeterSource):
+    """Every read() returns [n, n / 2] for the n-th read, starting at 1."""
+
+    count = 2
+
+    def __init__(self):
+        self.reads = 0
+        self.closed = False
+
+    def read(self):
+        self.reads += 1
+        return [float(self.reads), self.reads / 2.0]
+
+    def close(self):
+        self.closed = True
+
+
+def test_ring_max_since_wraps_around():
+    ring = main.LevelRing(1, 4)
+    assert ring.max_since(0) == (None, 0)
+    for v in (1.0, 5.0, 2.0):
+        ring.write([v])
+    assert ring.max_since(0) == ([5.0], 3)
+    for v in (3.0, 0.5, 0.25):
+        ring.write([v])
+    # Slots wrapped: samples 3..5 sit at the end and the start of the ring
+    assert ring.max_since(3) == ([3.0], 6)
+    assert ring.max_since(5) == ([0.25], 6)
+    # Older than the capacity: only the last four samples are still there
+    assert ring.max_since(0) == ([3.0], 6)
+    ring.write([4.0])
+    ring.write([1.0])
+    # End exactly on a ring boundary
+    assert ring.max_since(6) == ([4.0], 8)
+    assert ring.max_since(8) == (None, 8)
+
+
+def test_sampled_source_returns_max_hold_between_reads():
+    inner = CountingSource()
+    source = main.SampledMeterSource(inner, rate=500.0)
+    source.open()
+    try:
+        deadline = time.monotonic() + 2.0
+        while inner.reads < 5 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        first = source.read()
+        # The newest sample is the largest one here
+        assert first[0] >= 5.0
+        assert first[1] == first[0] / 2.0
+        # Nothing new yet: the last levels are repeated, not zeros
+        n = inner.reads
+        while inner.reads == n:
+            time.sleep(0.001)
+        assert source.read()[0] > first[0]
+    finally:
+        source.close()
+    assert inner.closed
+
+
+def test_vu_preset_settles_in_300_ms():
+    clock = FakeClock()
+    attack, release, hold = main.BALLISTICS_PRESETS['vu']
+    b = main.Ballistics(1, attack, release, hold, clock=clock)
+    b.process([0.0])
+    t = 0.0
+    while t < 0.3 - 1e-9:
+        t += 0.005
+        clock.t = t
+        level = b.process([1.0])[0]
+    assert level == pytest.approx(0.99, abs=0.002)
+    clock.t += 0.3
+    assert b.process([0.0])[0] == pytest.approx(0.01, abs=0.002)
+
+
+def test_ballistics_time_constant_and_hold():
+    clock = FakeClock()
+    b = main.Ballistics(2, attack=0.0, release=0.1, hold=0.05, clock=clock)
+    assert b.process([1.0, 0.5]) == [1.0, 0.5]
+    # Peak hold: no release until 50 ms after the last rise
+    clock.t = 0.04
+    assert b.process([0.0, 0.5]) == [1.0, 0.5]
+    clock.t = 0.14
+    # One time constant since the previous frame
+    assert b.process([0.0, 0.5])[0] == pytest.approx(1.0 / 2.718281828, rel=1e-6)
+
+
+def test_make_ballistics():
+    assert main.make_ballistics(2) is None
+    b = main.make_ballistics(2, 'vu', release_ms=500)
+    assert b.attack == pytest.approx(0.3 / 4.60517, rel=1e-4)
+    assert b.release == 0.5
+    assert main.make_ballistics(2, 'none', hold_ms=100).hold == 0.1
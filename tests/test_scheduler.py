@@ -0,0 +1,57 @@
+import pytest
+
+import main
+
+
+class FakeClock:
+    def __init__(self, t=100.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def test_frames_stay_on_the_grid_despite_render_cost():
+    clock = FakeClock()
+    sched = main.FrameScheduler(rate=20.0, idle_after=None, clock=clock)
+    for _ in range(10):
+        clock.t += 0.01  # render time
+        wait = sched.tick(silent=False)
+        assert wait == pytest.approx(0.04)
+        clock.t += wait
+    assert clock.t == pytest.approx(100.5)
+    assert sched.late == 0
+
+
+def test_late_frame_skips_ahead_instead_of_bursting():
+    clock = FakeClock()
+    sched = main.FrameScheduler(rate=10.0, idle_after=None, clock=clock)
+    clock.t += 0.35
+    wait = sched.tick(silent=False)
+    assert sched.late == 1
+    assert wait == pytest.approx(0.05)
+    clock.t += wait
+    assert sched.tick(silent=False) == pytest.approx(0.1)
+
+
+def test_idle_back_off_and_recovery():
+    clock = FakeClock()
+    sched = main.FrameScheduler(rate=20.0, idle_rate=2.0, idle_after=1.0, clock=clock)
+    waits = []
+    while clock.t < 102.0:
+        wait = sched.tick(silent=True)
+        waits.append(wait)
+        clock.t += wait
+    assert sched.idle
+    assert waits[-1] == pytest.approx(0.5)
+    # The first loud frame restores the full rate at once
+    assert sched.tick(silent=False) == pytest.approx(0.05)
+    assert not sched.idle
+
+
+def test_idle_disabled():
+    clock = FakeClock()
+    sched = main.FrameScheduler(rate=20.0, idle_rate=0, idle_after=1.0, clock=clock)
+    for _ in range(100):
+        clock.t += sched.tick(silent=True)
+    assert sched.tick(silent=True) == pytest.approx(0.05)
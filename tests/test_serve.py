@@ -0,0 +1,103 @@
+import json
+import socket
+import time
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def server():
+    srv = main.LevelBroadcastServer('tcp:127.0.0.1:0', ids=lambda: ['{a}', '{b}'], rate=lambda: 20.0)
+    srv.start()
+    yield srv
+    srv.close()
+
+
+def _connect(srv):
+    sock = socket.create_connection(srv.address, timeout=2.0)
+    return sock, sock.makefile('rb')
+
+
+def _wait_clients(srv, n):
+    deadline = time.monotonic() + 2.0
+    while len(srv.clients) < n and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(srv.clients) == n
+
+
+def test_hello_then_frames(server):
+    sock, f = _connect(server)
+    try:
+        assert json.loads(f.readline()) == {'hello': 1, 'ids': ['{a}', '{b}'], 'rate': 20.0}
+        _wait_clients(server, 1)
+        server(1.5, [0.25, 1.0])
+        frame = json.loads(f.readline())
+        assert frame['t'] == 1.5
+        assert frame['levels'] == [0.25, 1.0]
+        assert frame['seq'] == 1
+    finally:
+        sock.close()
+
+
+def test_slow_client_does_not_hold_back_others(server):
+    stalled = socket.socket()
+    stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    stalled.settimeout(2.0)
+    stalled.connect(server.address)
+    sock, f = _connect(server)
+    try:
+        f.readline()
+        _wait_clients(server, 2)
+        stalled_sub = next(sub for sub in server.clients
+                           if sub.writer.get_extra_info('peername') == stalled.getsockname())
+        fast_sub = next(sub for sub in server.clients if sub is not stalled_sub)
+        # The stalled client never reads. Frames are spaced out so each one can be sent to both
+        payload = [0.5] * 64
+        for i in range(600):
+            server(float(i), payload)
+            time.sleep(0.001)
+        server(9999.0, [0.0])
+        last = None
+        deadline = time.monotonic() + 5.0
+        while time.monotonic() < deadline:
+            last = json.loads(f.readline())
+            if last['t'] == 9999.0:
+                break
+        assert last['t'] == 9999.0
+        # What the stalled client was sent fits in its socket buffers (the kernel doubles the
+        # requested sizes) plus the transport's high-water mark; nothing queues beyond that
+        line = len(f'{{"seq":1,"t":1.000000,"levels":[{",".join(["0.5000"] * 64)}]}}\n')
+        bound = (2 * main.SERVE_SNDBUF + 2 * 4096 + main.SERVE_WRITE_HIGH_WATER) // line + 1
+        assert stalled_sub.sent <= bound
+        assert fast_sub.sent > 4 * bound
+    finally:
+        sock.close()
+        stalled.close()
+
+
+def test_rate_request_throttles_a_client(server):
+    sock, f = _connect(server)
+    try:
+        f.readline()
+        sock.sendall(b'{"rate": 2}\n')
+        _wait_clients(server, 1)
+        sub = next(iter(server.clients))
+        deadline = time.monotonic() + 2.0
+        while not sub.interval and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for i in range(21):
+            server(1000.0 + i * 0.05, [0.1])
+            time.sleep(0.002)
+        times = []
+        sock.settimeout(1.0)
+        try:
+            while True:
+                times.append(json.loads(f.readline())['t'])
+        except (socket.timeout, ValueError):
+            pass
+        # 1 s of frames at 20 Hz, thinned to 2 Hz
+        assert times == [1000.0, 1000.5, 1001.0]
+    finally:
+        sock.close()
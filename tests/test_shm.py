@@ -0,0 +1,66 @@
+import struct
+import time
+
+import pytest
+
+import main
+
+pytest.importorskip('multiprocessing.shared_memory')
+
+
+@pytest.fixture
+def name():
+    return f'vu_test_{time.monotonic_ns()}'
+
+
+def test_round_trip(name):
+    publisher = main.SharedLevelPublisher(name, capacity=4, ids=lambda: ['{a}', '{b}'])
+    try:
+        reader = main.SharedLevelReader(name)
+        try:
+            assert reader.read() is None
+            publisher(12.5, [0.25, 0.75])
+            frame = reader.read()
+            assert frame.seq == 2
+            assert frame.timestamp == 12.5
+            assert frame.levels == (0.25, 0.75)
+            assert reader.ids() == ['{a}', '{b}']
+            publisher(13.0, [0.5])
+            assert reader.read() == main.Frame(4, 13.0, (0.5,))
+        finally:
+            reader.close()
+    finally:
+        publisher.close()
+
+
+class _CheckedSeq:
+    """Stands in for _SHM_SEQ and checks the frame is complete whenever an even sequence is stored."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.checked = 0
+        self.seq = main._SHM_SEQ
+
+    def pack_into(self, buf, offset, seq):
+        if seq & 1 == 0:
+            count, _, timestamp = main._SHM_FRAME.unpack_from(buf, 24)
+            levels = struct.unpack_from(f'<{count}f', buf, main.SHM_LEVELS_OFFSET)
+            assert (timestamp, levels) == self.frames[seq // 2 - 1]
+            self.checked += 1
+        self.seq.pack_into(buf, offset, seq)
+
+    def unpack_from(self, buf, offset):
+        return self.seq.unpack_from(buf, offset)
+
+
+def test_even_sequence_is_stored_after_the_frame(name, monkeypatch):
+    frames = [(1.0, (0.5, 0.5)), (2.0, (1.0,)), (3.0, (0.25, 0.5, 0.75))]
+    checked = _CheckedSeq(frames)
+    monkeypatch.setattr(main, '_SHM_SEQ', checked)
+    publisher = main.SharedLevelPublisher(name, capacity=4)
+    try:
+        for t, levels in frames:
+            publisher(t, list(levels))
+    finally:
+        publisher.close()
+    assert checked.checked == 3
@@ -0,0 +1,309 @@
+import os
+import struct
+import threading
+import time
+
+import pytest
+
+import main
+
+fifo_only = pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason='needs POSIX FIFOs')
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+@fifo_only
+def test_fifo_close_without_writer_stops_reader(tmp_path):
+    path = str(tmp_path / 'vu.pcm')
+    os.mkfifo(path)
+    source = main.FifoMeterSource(path)
+    source.open()
+    reader = source._reader
+    t0 = time.monotonic()
+    source.close()
+    assert time.monotonic() - t0 < 1.0
+    assert not reader.is_alive()
+    assert source._fd is None
+
+
+@fifo_only
+def test_fifo_close_releases_pipe_for_restart(tmp_path):
+    path = str(tmp_path / 'vu.pcm')
+    os.mkfifo(path)
+    source = main.FifoMeterSource(path, channels=2)
+    source.open()
+    writer = os.open(path, os.O_WRONLY)
+    try:
+        os.write(writer, struct.pack('<4h', 16384, -32768, 0, 8192))
+        assert _wait_for(lambda: source._peaks != [0.0, 0.0])
+        assert source.read() == pytest.approx([0.5, 1.0], abs=1e-3)
+        reader = source._reader
+        # The writer stays connected: the reader is waiting for more data when closed
+        source.close()
+        assert not reader.is_alive()
+        assert source._fd is None
+
+        source.open()
+        assert _wait_for(lambda: source._fd is not None)
+        os.write(writer, struct.pack('<2h', 0, 16384))
+        assert _wait_for(lambda: source._peaks != [0.0, 0.0])
+        assert source.read() == pytest.approx([0.0, 0.5], abs=1e-3)
+        source.close()
+    finally:
+        os.close(writer)
+
+
+class _SlowMeter:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def GetPeakValue(self):
+        time.sleep(self.delay)
+        return 0.5
+
+    def Release(self):
+        pass
+
+
+class _SlowEndpoints(main.FakeEndpointMeterSource):
+    """Fake endpoints whose meters always answer, but take `delay` seconds per read."""
+
+    def __init__(self, delay, count=1):
+        super().__init__([1] * count, per_channel=False)
+        self.delay = delay
+        self.activations = 0
+
+    def _activate(self, enumerator, eid):
+        self.activations += 1
+        return _SlowMeter(self.delay)
+
+
+def test_persistently_slow_endpoint_is_not_swapped_back_in(monkeypatch):
+    monkeypatch.setattr(main, 'METER_RETRY_INITIAL', 0.02)
+    source = _SlowEndpoints(0.03)
+    source.open()
+    try:
+        stalled = 0
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            source.read()
+            if time.perf_counter() - t0 >= main.METER_SLOW_READ_S:
+                stalled += 1
+            time.sleep(0.01)
+        # At most the strikes before the first failure; recovery keeps probing, but never swaps it in
+        assert stalled <= main.METER_SLOW_STRIKES
+        assert source.reactivations == 0
+        assert source.activations > 1
+        assert source.health() == ['recovering']
+    finally:
+        source.close()
+
+
+class _HungMeter:
+    def __init__(self, gate):
+        self.gate = gate
+
+    def GetPeakValue(self):
+        self.gate.wait()
+        return 1.0
+
+    def Release(self):
+        pass
+
+
+class _HungFirstEndpoint(_SlowEndpoints):
+    """Two fake endpoints: every meter of the first one hangs until `gate` is set."""
+
+    def __init__(self, gate):
+        super().__init__(0.0, count=2)
+        self.gate = gate
+
+    def _activate(self, enumerator, eid):
+        self.activations += 1
+        return _HungMeter(self.gate) if eid == 'fake:0' else _SlowMeter(0.0)
+
+
+def test_hung_endpoint_only_freezes_its_own_bar(monkeypatch):
+    monkeypatch.setattr(main, 'METER_RETRY_INITIAL', 0.02)
+    gate = threading.Event()
+    source = _HungFirstEndpoint(gate)
+    source.open()
+    try:
+        times = []
+        for _ in range(20):
+            t0 = time.perf_counter()
+            levels = source.read()
+            times.append(time.perf_counter() - t0)
+            assert levels[1] == 0.5
+            time.sleep(0.01)
+        # Only the first frame waits for the hung read, and no longer than the deadline
+        assert times[0] < main.METER_SLOW_READ_S + 0.015
+        assert max(times[1:]) < main.METER_SLOW_READ_S
+        assert source.health() == ['recovering', 'ok']
+        # Probes of the hung endpoint park on their own pollers: the other one still recovers
+        source._fail(source._slots[1])
+        assert _wait_for(lambda: source.read()[1] == 0.5 and source.health() == ['recovering', 'ok'])
+        assert source.reactivations == 1
+        assert source.activations > 3
+    finally:
+        gate.set()
+        source.close()
+
+
+def test_fast_endpoint_recovers_after_failure(monkeypatch):
+    monkeypatch.setattr(main, 'METER_RETRY_INITIAL', 0.02)
+    source = _SlowEndpoints(0.0)
+    source.open()
+    try:
+        source._fail(source._slots[0])
+        assert _wait_for(lambda: source.read() == [0.5] and source.health() == ['ok'])
+        assert source.reactivations == 1
+    finally:
+        source.close()
+
+
+def test_backoff_persists_across_failure_episodes(monkeypatch):
+    source = _SlowEndpoints(0.0)
+    slot = main._MeterSlot('fake:0')
+    source._fail(slot)
+    source._fail(slot)
+    source._fail(slot)
+    delays = []
+    while not source._retry_q.empty():
+        delays.append(source._retry_q.get()[2])
+    assert delays == [main.METER_RETRY_INITIAL, 2 * main.METER_RETRY_INITIAL, 4 * main.METER_RETRY_INITIAL]
+    # A meter that stayed healthy long enough starts the next episode from the initial delay
+    slot.ok_since = time.monotonic() - main.METER_RETRY_MAX
+    source._fail(slot)
+    assert source._retry_q.get()[2] == main.METER_RETRY_INITIAL
+
+
+class FakeClock:
+    def __init__(self, t=0.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+class ListSource(main.MeterSource):
+    """Returns the given frames in order; set_endpoints() switches to one level per endpoint id."""
+
+    def __init__(self, frames):
+        self.frames = [list(f) for f in frames]
+        self.count = len(self.frames[0])
+        self.closed = False
+
+    def read(self):
+        return self.frames.pop(0)
+
+    def set_endpoints(self, endpoint_ids):
+        self.count = len(endpoint_ids)
+
+    def close(self):
+        self.closed = True
+
+
+FRAMES = [[0.0, 0.25], [0.5, 0.125], [1.0, 0.0], [0.75, 0.5]]
+
+
+def _record(path, frames, clock, step=0.01):
+    source = main.RecordingMeterSource(ListSource(frames), str(path), 100.0, ['{a}', '{b}'], clock=clock)
+    source.open()
+    for _ in frames:
+        source.read()
+        clock.t += step
+    return source
+
+
+def test_recording_round_trip(tmp_path):
+    path = tmp_path / 'trace.vurec'
+    clock = FakeClock(50.0)
+    recorder = _record(path, FRAMES, clock)
+    recorder.close()
+    assert recorder.inner.closed
+    header = main.read_recording_header(str(path))
+    assert (header.count, header.ids, header.rate) == (2, ['{a}', '{b}'], 100.0)
+    assert header.data_offset % 8 == 0
+    replay = main.ReplayMeterSource(str(path), fast=True, loop=False)
+    replay.open()
+    try:
+        assert [replay.read() for _ in FRAMES] == FRAMES
+        with pytest.raises(EOFError):
+            replay.read()
+    finally:
+        replay.close()
+
+
+def test_replay_ignores_truncated_record(tmp_path):
+    path = tmp_path / 'trace.vurec'
+    _record(path, FRAMES, FakeClock()).close()
+    header = main.read_recording_header(str(path))
+    with open(path, 'ab') as f:
+        f.write(header.record.pack(9.0, 1.0, 1.0)[:-3])
+    replay = main.ReplayMeterSource(str(path), fast=True, loop=False)
+    replay.open()
+    try:
+        assert replay.records == len(FRAMES)
+        assert [replay.read() for _ in FRAMES] == FRAMES
+        with pytest.raises(EOFError):
+            replay.read()
+    finally:
+        replay.close()
+
+
+def test_paced_replay_returns_peak_of_elapsed_records(tmp_path):
+    path = tmp_path / 'trace.vurec'
+    _record(path, FRAMES, FakeClock(), step=0.01).close()  # records at 0, 10, 20 and 30 ms
+    clock = FakeClock(100.0)
+    replay = main.ReplayMeterSource(str(path), loop=True, clock=clock)
+    replay.open()
+    try:
+        assert replay.read() == FRAMES[0]
+        clock.t += 0.025
+        # Records at 10 and 20 ms: per-device max
+        assert replay.read() == [1.0, 0.125]
+        clock.t += 0.001
+        # Nothing new since the last frame: hold
+        assert replay.read() == [1.0, 0.125]
+        clock.t += 0.01
+        assert replay.read() == FRAMES[3]
+        # Past the end: loops to the start
+        clock.t += 0.01
+        assert replay.read() == FRAMES[0]
+    finally:
+        replay.close()
+
+
+def test_device_count_change_starts_a_new_segment(tmp_path):
+    path = tmp_path / 'trace.vurec'
+    clock = FakeClock()
+    inner = ListSource(FRAMES[:2] + [[0.5, 0.5, 0.25]])
+    recorder = main.RecordingMeterSource(inner, str(path), 100.0, ['{a}', '{b}'], clock=clock)
+    recorder.open()
+    recorder.read()
+    recorder.read()
+    recorder.set_endpoints(['{a}', '{b}'])
+    assert recorder.segments == 0
+    recorder.set_endpoints(['{a}', '{b}', '{c}'])
+    recorder.read()
+    recorder.close()
+    assert recorder.segments == 1
+    first = main.read_recording_header(str(path))
+    second = main.read_recording_header(f'{path}.1')
+    assert (first.count, second.count) == (2, 3)
+    assert second.ids == ['{a}', '{b}', '{c}']
+    replay = main.ReplayMeterSource(f'{path}.1', fast=True, loop=False)
+    replay.open()
+    try:
+        assert replay.read() == [0.5, 0.5, 0.25]
+    finally:
+        replay.close()
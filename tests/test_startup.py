@@ -0,0 +1,32 @@
+import main
+
+
+def test_report_waits_for_phases_that_apply(capsys):
+    profile = main.StartupProfile(0.0)
+    profile.enabled = True
+    for phase in main.StartupProfile.PHASES[:-1]:
+        profile.mark(phase)
+    assert capsys.readouterr().err == ''
+    profile.skip('first icon shown')
+    err = capsys.readouterr().err
+    assert 'first frame' in err
+    assert 'first icon shown' not in err
+    # Reported once only
+    profile.mark('first icon shown')
+    assert capsys.readouterr().err == ''
+
+
+def test_report_after_last_phase(capsys):
+    profile = main.StartupProfile(0.0)
+    profile.enabled = True
+    for phase in reversed(main.StartupProfile.PHASES):
+        profile.mark(phase)
+    err = capsys.readouterr().err
+    assert all(phase in err for phase in main.StartupProfile.PHASES)
+
+
+def test_disabled_profile_prints_nothing(capsys):
+    profile = main.StartupProfile(0.0)
+    for phase in main.StartupProfile.PHASES:
+        profile.mark(phase)
+    assert capsys.readouterr() == ('', '')
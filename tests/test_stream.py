@@ -0,0 +1,111 @@
+import io
+import json
+
+import main
+
+
+class FakeClock:
+    def __init__(self, t=0.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+class Out(io.BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+
+class BrokenOut:
+    def __init__(self):
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        raise BrokenPipeError
+
+    def flush(self):
+        pass
+
+
+def _lines(out):
+    return out.getvalue().decode('utf-8').splitlines()
+
+
+def test_csv_header_then_rows():
+    out = Out()
+    stream = main.LevelStream(out, 'csv', names=['Speakers', '', 'Head,set'], batch_bytes=1)
+    stream(1.5, [0.25, 1.0, 0.0])
+    stream(2.0, [0.5, 0.5, 0.5])
+    assert _lines(out) == [
+        'timestamp,Speakers,level1,"Head,set"',
+        '1.500000,0.2500,1.0000,0.0000',
+        '2.000000,0.5000,0.5000,0.5000',
+    ]
+
+
+def test_ndjson_lines():
+    out = Out()
+    stream = main.LevelStream(out, 'ndjson', batch_bytes=1)
+    stream(3.25, [0.125, 1.0])
+    assert [json.loads(line) for line in _lines(out)] == [{'t': 3.25, 'levels': [0.125, 1.0]}]
+
+
+def test_on_change_drops_repeated_levels():
+    out = Out()
+    stream = main.LevelStream(out, 'ndjson', on_change=True, batch_bytes=1)
+    stream(1.0, [0.5])
+    stream(2.0, [0.50001])  # same at 4 decimals
+    stream(3.0, [0.6])
+    stream(4.0, [0.5])
+    assert [json.loads(line)['t'] for line in _lines(out)] == [1.0, 3.0, 4.0]
+    assert stream.lines == 3
+
+
+def test_flushes_by_batch_size():
+    out = Out()
+    clock = FakeClock()
+    stream = main.LevelStream(out, 'ndjson', batch_bytes=100, batch_s=10.0, clock=clock)
+    stream(1.0, [0.5])
+    stream(2.0, [0.5])
+    assert out.writes == 0
+    for i in range(3):
+        stream(3.0 + i, [0.5])
+    assert out.writes == 1
+    assert len(_lines(out)) == 4
+    stream.flush()
+    assert len(_lines(out)) == 5
+
+
+def test_flushes_by_age():
+    out = Out()
+    clock = FakeClock()
+    stream = main.LevelStream(out, 'ndjson', batch_bytes=1 << 20, batch_s=0.1, clock=clock)
+    stream(1.0, [0.5])
+    clock.t = 0.05
+    stream(2.0, [0.5])
+    assert out.writes == 0
+    clock.t = 0.1
+    stream(3.0, [0.5])
+    assert out.writes == 1
+    assert len(_lines(out)) == 3
+    # The next batch is timed from its own first line
+    clock.t = 0.15
+    stream(4.0, [0.5])
+    assert out.writes == 1
+
+
+def test_broken_pipe_stops_the_stream():
+    out = BrokenOut()
+    stream = main.LevelStream(out, 'csv', batch_bytes=1)
+    stream(1.0, [0.5])
+    assert stream.broken
+    stream(2.0, [0.5])
+    stream.flush()
+    assert out.writes == 1